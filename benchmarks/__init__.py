@@ -0,0 +1,3 @@
+"""
+Offline benchmarks of the scraping pipeline against a local stand-in for t.me.
+"""
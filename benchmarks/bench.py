@@ -0,0 +1,207 @@
+from datetime import datetime
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+from benchmarks.server import ChannelServer
+from tg_scraper.rate import RateController
+from tg_scraper.scrape import iter_batches, iter_posts
+from tg_scraper.transform import content_stats
+from tg_scraper.writer import ParquetBatchWriter, BATCH_SIZE, COMPRESSION, SUFFIXES, file_suffix
+
+
+# Benchmark results are appended to this file, one JSON object per run
+RESULTS = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+
+# Pipeline stages with latencies
+STAGES = ('fetch', 'parse', 'filter', 'build', 'transform', 'write')
+
+
+def percentiles(values):
+    """
+    This function summarizes stage latencies in milliseconds.
+
+    Returns:
+        dict with the number of samples, total seconds and p50, p90, p99 and max milliseconds.
+    """
+    values = sorted(values)
+    if not values:
+        return {'count': 0, 'total_s': 0.0}
+
+    def pick(q):
+        return round(1000 * values[min(len(values) - 1, int(q * len(values)))], 3)
+
+    return {
+        'count': len(values),
+        'total_s': round(sum(values), 3),
+        'p50_ms': pick(0.50),
+        'p90_ms': pick(0.90),
+        'p99_ms': pick(0.99),
+        'max_ms': round(1000 * values[-1], 3),
+        }
+
+
+def peak_rss_mb():
+    """
+    This function returns the peak resident memory of the process in megabytes,
+    or None where it cannot be measured.
+
+    Returns:
+        float or None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def version():
+    """
+    This function returns the current git commit of the repository, if available.
+
+    Returns:
+        str or None
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(posts=10000, text_size=500, latency=0.0, error_rate=0.0, batch_size=BATCH_SIZE, fast=False, compression=COMPRESSION, compression_level=None, stats=False):
+    """
+    This function scrapes a synthetic channel from a local server into a parquet file
+    and measures the throughput and per-stage latencies of the pipeline.
+
+    Parameters:
+    - posts (int): The number of posts in the channel. The default value is 10000.
+
+    - text_size (int): The number of characters in a post. The default value is 500.
+
+    - latency (float): The server delay of every response in seconds. The default value is 0.
+
+    - error_rate (float): The share of failed server responses. The default value is 0.
+
+    - batch_size (int): The number of posts in a row group. The default value is BATCH_SIZE.
+
+    - fast (bool): If True, pages are extracted straight into Arrow columns.
+      The default value is False.
+
+    - compression (str): The compression codec. The default value is COMPRESSION.
+
+    - compression_level (int): The codec compression level. The default value is the codec default.
+
+    - stats (bool): If True, the content statistics columns are added to the row groups,
+      see 'content_stats'. The default value is False.
+
+    Returns:
+        dict with the benchmark parameters and results.
+    """
+    timings = {stage: [] for stage in STAGES}
+
+    def on_timing(stage, seconds, items=1):
+        timings[stage].append(seconds)
+
+    # Requests are not throttled, so the benchmark measures the pipeline itself
+    rate_controller = RateController(rate=10000, max_rate=10000, burst=100)
+
+    with ChannelServer(posts, text_size, latency, error_rate) as server, tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f'bench{file_suffix(compression)}')
+        start = time.perf_counter()
+
+        with ParquetBatchWriter(path, batch_size=batch_size, on_timing=on_timing, compression=compression, compression_level=compression_level, transforms=[content_stats] if stats else None) as writer:
+            if fast:
+                for batch in iter_batches('bench', '2000-01-01', '2100-12-31', base_url=server.url, rate_controller=rate_controller, on_timing=on_timing):
+                    writer.write_batch(batch)
+            else:
+                for post in iter_posts('bench', '2000-01-01', '2100-12-31', base_url=server.url, rate_controller=rate_controller, on_timing=on_timing):
+                    writer.write(post)
+
+        elapsed = time.perf_counter() - start
+        file_size = os.path.getsize(path)
+
+    return {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'version': version(),
+        'params': {'posts': posts, 'text_size': text_size, 'latency': latency, 'error_rate': error_rate, 'batch_size': batch_size, 'fast': fast, 'compression': compression, 'compression_level': compression_level, 'stats': stats},
+        'rows': writer.rows_written,
+        'seconds': round(elapsed, 3),
+        'posts_per_minute': round(60 * writer.rows_written / elapsed) if elapsed else None,
+        'file_size_mb': round(file_size / (1024 * 1024), 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {stage: percentiles(values) for stage, values in timings.items()},
+        }
+
+
+def previous_result(params, path=RESULTS):
+    """
+    This function finds the latest stored result of a benchmark with the same parameters.
+
+    Returns:
+        dict or None
+    """
+    if not os.path.exists(path):
+        return None
+
+    previous = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            result = json.loads(line)
+            if result['params'] == params:
+                previous = result
+    return previous
+
+
+def report(result, previous=None):
+    """
+    This function prints a benchmark result and its change against a previous one.
+
+    Returns:
+        None
+    """
+    print(f"\n🔹 {result['rows']} posts in {result['seconds']} seconds: {result['posts_per_minute']} posts per minute")
+    print(f"🔹 Output file {result['file_size_mb']} MB, peak RSS {result['peak_rss_mb']} MB")
+
+    for stage, summary in result['stages'].items():
+        if summary['count']:
+            print(f"◻️ {stage:<6} n={summary['count']:<6} total={summary['total_s']}s p50={summary['p50_ms']}ms p90={summary['p90_ms']}ms p99={summary['p99_ms']}ms")
+
+    if previous and previous['posts_per_minute'] and result['posts_per_minute']:
+        change = 100 * (result['posts_per_minute'] / previous['posts_per_minute'] - 1)
+        print(f"\n{'🔴' if change < -10 else '✔️'} Throughput {change:+.1f}% against {previous['version']} ({previous['time']})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scraping pipeline against a local synthetic t.me server.')
+    parser.add_argument('--posts', type=int, default=10000, help='posts in the synthetic channel (10000 by default)')
+    parser.add_argument('--text-size', type=int, default=500, help='characters in a post (500 by default)')
+    parser.add_argument('--latency', type=float, default=0.0, help='server delay of every response in seconds (0 by default)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of failed server responses (0 by default)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'posts in a row group ({BATCH_SIZE} by default)')
+    parser.add_argument('--fast', action='store_true', help='extract pages straight into Arrow columns with lxml')
+    parser.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the output file ('{COMPRESSION}' by default)")
+    parser.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    parser.add_argument('--content-stats', action='store_true', help='add the content statistics columns to the row groups')
+    parser.add_argument('--results', default=RESULTS, help='file to append the results to (benchmarks/results.jsonl by default)')
+    parser.add_argument('--no-save', action='store_true', help='do not store the result')
+    args = parser.parse_args()
+
+    print(f"\n⏰ Scraping {args.posts} synthetic posts of {args.text_size} characters...")
+
+    result = run_benchmark(args.posts, args.text_size, args.latency, args.error_rate, args.batch_size, args.fast, args.compression, args.compression_level, args.content_stats)
+    report(result, previous_result(result['params'], args.results))
+
+    if not args.no_save:
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
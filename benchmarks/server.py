@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import html
+import random
+import threading
+import time
+import urllib.parse
+
+
+# Number of posts in a t.me channel page
+PAGE_SIZE = 20
+
+# Date of the first synthetic post and the interval between posts
+FIRST_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+POST_INTERVAL = timedelta(minutes=10)
+
+
+def post_date(post_id):
+    """
+    This function returns the publication date of a synthetic post.
+
+    Returns:
+        datetime
+    """
+    return FIRST_DATE + post_id * POST_INTERVAL
+
+
+def render_page(channel_name, post_ids, text_size):
+    """
+    This function renders a t.me/s/<channel> page with the posts, oldest first,
+    in the markup the scrapers expect.
+
+    Returns:
+        str
+    """
+    words = 'lorem ipsum dolor sit amet consectetur adipiscing elit'.split()
+    messages = []
+
+    for post_id in post_ids:
+        # Synthetic texts are reproducible for a post, so repeated runs parse the same pages
+        rng = random.Random(post_id)
+        text = ''
+        while len(text) < text_size:
+            text += rng.choice(words) + ' '
+        date = post_date(post_id).isoformat()
+
+        messages.append(
+            f'<div class="tgme_widget_message_wrap"><div class="tgme_widget_message" data-post="{channel_name}/{post_id}" data-view="1">'
+            f'<div class="tgme_widget_message_text">{html.escape(text[:text_size])}<a href="https://example.com/{post_id}">link</a> #tag{post_id % 7}</div>'
+            f'<div class="tgme_widget_message_footer"><a class="tgme_widget_message_date" href="https://t.me/{channel_name}/{post_id}">'
+            f'<time datetime="{date}" class="time">{date[11:16]}</time></a></div>'
+            f'</div></div>'
+            )
+
+    more = ''
+    if post_ids and post_ids[0] > 1:
+        more = f'<a class="tme_messages_more" data-before="{post_ids[0]}" href="/s/{channel_name}?before={post_ids[0]}"></a>'
+
+    return (
+        f'<!DOCTYPE html><html><head><link rel="canonical" href="https://t.me/s/{channel_name}"></head>'
+        f'<body><section class="tgme_channel_history">{more}{"".join(messages)}</section></body></html>'
+        )
+
+
+class ChannelServer(ThreadingHTTPServer):
+    """
+    This class is a local HTTP server that serves synthetic t.me channel pages
+    at /s/<channel> and /s/<channel>?before=<post_id>.
+
+    Every channel has posts with ids from 1 to 'posts', one every POST_INTERVAL
+    from FIRST_DATE. Every response can be delayed by 'latency' seconds and
+    fails with a 500 status with 'error_rate' probability.
+
+    Parameters:
+    - posts (int): The number of posts in a channel. The default value is 10000.
+
+    - text_size (int): The number of characters in a post. The default value is 500.
+
+    - latency (float): The number of seconds every response is delayed.
+      The default value is 0.
+
+    - error_rate (float): The share of failed responses. The default value is 0.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, posts=10000, text_size=500, latency=0.0, error_rate=0.0):
+        super().__init__(('127.0.0.1', 0), _PageHandler)
+        self.posts = posts
+        self.text_size = text_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(0)
+        self._random_lock = threading.Lock()
+
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+    def fails(self):
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if len(parts) != 2 or parts[0] != 's' or server.fails():
+            self.send_error(404 if len(parts) != 2 or parts[0] != 's' else 500)
+            return
+
+        before = urllib.parse.parse_qs(url.query).get('before', [None])[0]
+        newest = min(server.posts, int(before) - 1) if before else server.posts
+        post_ids = list(range(max(1, newest - PAGE_SIZE + 1), newest + 1))
+
+        body = render_page(parts[1], post_ids, server.text_size).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        # Keep the benchmark output clean
+        pass
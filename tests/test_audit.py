@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+from tg_scraper.audit import IdRanges, audit_channel
+from tg_scraper.writer import ParquetBatchWriter
+
+
+def test_id_ranges_merge_runs_and_count_duplicates():
+    ids = IdRanges()
+    ids.add(pa.array([7, 1, 2, 3, 9], pa.int64()))
+    ids.add(pa.array([4, 3, 12, 12, 8], pa.int64()))
+    ids.add(pa.array([20, 11, 2], pa.int64()))
+
+    assert ids.ranges == [[1, 4], [7, 9], [11, 12], [20, 20]]
+    assert ids.duplicates == 3
+    assert len(ids) == 10
+    assert ids.gaps() == [(5, 6), (10, 10), (13, 19)]
+
+
+def test_unreadable_files_are_listed_in_the_report(tmp_path):
+    with ParquetBatchWriter(str(tmp_path / 'tg-posts-channel-run.parquet.gzip')) as writer:
+        for post_id in range(1, 11):
+            writer.write({'post_id': post_id, 'post_url': 'url', 'date': datetime(2024, 1, 1, tzinfo=timezone.utc), 'content': 'post'})
+    (tmp_path / 'tg-posts-channel-broken.parquet.gzip').write_bytes(b'not a parquet file')
+
+    report = audit_channel('channel', str(tmp_path))
+
+    assert report['unreadable'] == ['tg-posts-channel-broken.parquet.gzip']
+    assert report['files'] == 2
+    assert report['ranges'] == [[1, 10]]
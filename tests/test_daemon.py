@@ -0,0 +1,33 @@
+import glob
+import os
+
+import pyarrow.parquet as pq
+
+from benchmarks.server import ChannelServer
+from tg_scraper.rate import RateController
+from tg_scraper.seen import SeenIndex
+import tg_scraper.channel
+import tg_scraper.daemon
+
+
+def test_micro_batches_are_readable_before_the_file_is_rotated(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    monkeypatch.setattr(tg_scraper.daemon, 'FLUSH_INTERVAL', 0)
+
+    with ChannelServer(posts=50, text_size=10) as server:
+        init = tg_scraper.channel.ChannelScraper.__init__
+        monkeypatch.setattr(tg_scraper.channel.ChannelScraper, '__init__', lambda self, *args, **kwargs: init(self, *args, **{**kwargs, 'base_url': server.url}))
+        poller = tg_scraper.daemon.ChannelPoller('channel', '2000-01-01', folder, rate_controller=RateController(rate=100, max_rate=100))
+
+        poller.poll()
+        server.posts = 70
+        poller.poll()
+
+        # Every micro-batch is a closed file of its own, and only stored posts are marked as seen
+        parts = sorted(glob.glob(os.path.join(folder, 'tg-posts-channel-*.part-*')))
+        assert [pq.read_table(part).num_rows for part in parts] == [50, 20]
+        assert SeenIndex.load('channel', folder).ranges == [[1, 70]]
+
+        poller.close()
+
+    assert glob.glob(os.path.join(folder, 'tg-posts-channel-*.part-*')) == []
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from tg_scraper.dataset import DatasetWriter, compact, channel_folder, unique_posts
+from tg_scraper.writer import SCHEMA
+
+
+def posts(post_ids):
+    return pa.table({
+        'post_id': pa.array(post_ids, pa.int64()),
+        'post_url': [f"https://t.me/s/channel/{post_id}" for post_id in post_ids],
+        'date': pa.array([datetime(2024, 1, 1, tzinfo=timezone.utc)] * len(post_ids), SCHEMA.field('date').type),
+        'content': [f"post {post_id}" for post_id in post_ids],
+        }, schema=SCHEMA)
+
+
+def test_unique_posts_keeps_the_first_of_repeated_posts():
+    table = posts([5, 5, 6, 7, 7, 8]).set_column(3, 'content', pa.array(['a', 'b', 'c', 'd', 'e', 'f']))
+
+    unique = unique_posts(table)
+
+    assert unique.column('post_id').to_pylist() == [5, 6, 7, 8]
+    assert unique.column('content').to_pylist() == ['a', 'c', 'd', 'f']
+
+
+def test_compact_removes_duplicates_without_losing_posts(tmp_path):
+    # Two writers of the same channel store posts 6 and 7 twice
+    with DatasetWriter(str(tmp_path), 'channel') as writer:
+        writer.write_batch(posts(list(range(1, 11))))
+    folder = os.path.join(channel_folder(str(tmp_path), 'channel'), 'year=2024', 'month=1')
+    ds.write_dataset(posts([6, 7]), folder, format='parquet', basename_template='part-other-{i}.parquet', existing_data_behavior='overwrite_or_ignore')
+
+    partitions, files_before, files_after = compact(str(tmp_path), 'channel')
+
+    stored = ds.dataset(folder, format='parquet').to_table()
+    assert (partitions, files_before, files_after) == (1, 2, 1)
+    assert stored.column('post_id').to_pylist() == list(range(1, 11))
+
+
+def test_writer_skips_posts_stored_by_another_writer_meanwhile(tmp_path):
+    with DatasetWriter(str(tmp_path), 'channel', batch_size=5) as first, DatasetWriter(str(tmp_path), 'channel', batch_size=5) as second:
+        first.write_batch(posts([1, 2, 3, 4, 5]))
+        second.write_batch(posts([4, 5, 6, 7, 8]))
+        first.write_batch(posts([6, 7, 8, 9, 10]))
+
+    stored = ds.dataset(channel_folder(str(tmp_path), 'channel'), format='parquet').to_table()
+    assert sorted(stored.column('post_id').to_pylist()) == list(range(1, 11))
@@ -0,0 +1,64 @@
+import glob
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.server import ChannelServer
+from tg_scraper.cli import scrape_incremental
+from tg_scraper.manifest import Manifest
+from tg_scraper.rate import RateController
+import tg_scraper.channel
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # Every scraper of the run talks to the local channel server without throttling
+    with ChannelServer(posts=600, text_size=10) as server:
+        init = tg_scraper.channel.ChannelScraper.__init__
+        monkeypatch.setattr(tg_scraper.channel.ChannelScraper, '__init__', lambda self, *args, **kwargs: init(self, *args, **{**kwargs, 'base_url': server.url}))
+        monkeypatch.setitem(RateController._hosts, 't.me', RateController(rate=100, max_rate=100))
+        yield server
+
+
+def stored_ids(folder):
+    return sorted(post_id for path in glob.glob(os.path.join(folder, 'tg-posts-channel-*.parquet*'))
+                  for post_id in pq.read_table(path).column('post_id').to_pylist())
+
+
+def test_interrupted_first_run_resumes_below_the_stored_posts(server, tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    record_batch = Manifest.record_batch
+    interrupted = []
+
+    # The first run is interrupted right after its first row group is stored
+    def interrupt(self, batch):
+        record_batch(self, batch)
+        if not interrupted:
+            interrupted.append(batch.num_rows)
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(Manifest, 'record_batch', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        scrape_incremental('channel', '2000-01-01', folder=folder, writer_options=dict(batch_size=100))
+    assert Manifest.load('channel', folder).ranges == [[501, 600]]
+
+    scrape_incremental('channel', '2000-01-01', folder=folder, writer_options=dict(batch_size=100))
+
+    assert Manifest.load('channel', folder).ranges == [[1, 600]]
+    assert stored_ids(folder) == list(range(1, 601))
+
+
+def test_walk_stopped_by_the_start_date_leaves_the_gap_open(server, tmp_path):
+    folder = str(tmp_path)
+    scrape_incremental('channel', '2000-01-01', folder=folder)
+
+    # Posts 601-719 are published before the start date of the next run
+    server.posts = 900
+    scrape_incremental('channel', '2024-01-06', folder=folder)
+    assert Manifest.load('channel', folder).ranges == [[1, 600], [720, 900]]
+
+    scrape_incremental('channel', '2000-01-01', folder=folder)
+
+    assert Manifest.load('channel', folder).ranges == [[1, 900]]
+    assert stored_ids(folder) == list(range(1, 901))
@@ -0,0 +1,28 @@
+import pyarrow as pa
+
+from benchmarks.server import ChannelServer
+from tg_scraper.rate import RateController
+from tg_scraper.scrape import iter_batches
+from tg_scraper.seen import SeenIndex
+
+
+def test_remove_splits_the_ranges_holding_the_posts(tmp_path):
+    seen = SeenIndex('channel', str(tmp_path))
+    seen.add_ranges([[1, 10], [20, 30]])
+
+    seen.remove([1, 5, 6, 9, 10, 11, 25])
+
+    assert seen.ranges == [[2, 4], [7, 8], [20, 24], [26, 30]]
+    assert 5 not in seen and 24 in seen
+
+
+def test_walk_continues_below_a_stored_range(tmp_path):
+    seen = SeenIndex('channel', str(tmp_path))
+    seen.add_ranges([[100, 300]])
+
+    with ChannelServer(posts=400, text_size=10) as server:
+        batches = list(iter_batches('channel', '2000-01-01', '2100-01-01', seen=seen, stop_after=50,
+                                    base_url=server.url, rate_controller=RateController(rate=100, max_rate=100)))
+
+    post_ids = pa.Table.from_batches(batches).column('post_id').to_pylist()
+    assert post_ids == list(range(400, 300, -1)) + list(range(99, 0, -1))
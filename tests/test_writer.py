@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+import os
+import subprocess
+import sys
+
+import pyarrow.parquet as pq
+
+from tg_scraper.writer import ParquetBatchWriter, segment_paths
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Writes 350 posts in row groups of 100 and is killed without closing the writer
+KILLED_RUN = """
+from datetime import datetime, timezone
+import os, sys
+from tg_scraper.writer import ParquetBatchWriter
+writer = ParquetBatchWriter(sys.argv[1], batch_size=100)
+for post_id in range(350):
+    writer.write({'post_id': post_id, 'post_url': 'url', 'date': datetime(2024, 1, 1, tzinfo=timezone.utc), 'content': 'post'})
+os._exit(1)
+"""
+
+
+def test_flushed_row_groups_survive_a_killed_process(tmp_path):
+    path = str(tmp_path / 'tg-posts-channel-run.parquet.gzip')
+
+    subprocess.run([sys.executable, '-c', KILLED_RUN, path], cwd=ROOT, check=False)
+
+    parts = segment_paths(path)
+    assert len(parts) == 3
+    assert sum(pq.read_table(part).num_rows for part in parts) == 300
+
+
+def test_close_merges_the_parts_into_the_output_file(tmp_path):
+    path = str(tmp_path / 'tg-posts-channel-run.parquet.gzip')
+    flushed = []
+
+    with ParquetBatchWriter(path, batch_size=100, on_flush=lambda batch: flushed.append(len(segment_paths(path)))) as writer:
+        for post_id in range(250):
+            writer.write({'post_id': post_id, 'post_url': 'url', 'date': datetime(2024, 1, 1, tzinfo=timezone.utc), 'content': 'post'})
+
+    assert flushed == [1, 2, 3]
+    assert segment_paths(path) == []
+    assert pq.read_table(path).column('post_id').to_pylist() == list(range(250))
+    assert pq.ParquetFile(path).num_row_groups == 3
@@ -1,19 +1,16 @@
 # Import necessary modules
-from datetime import datetime
-import time
-import random
+from datetime import datetime, timedelta, timezone
 import os
 import sys
-import snscrape.modules.telegram as tg
-from pyarrow import Table
-from pyarrow.parquet import write_table
+import threading
+import time
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtWidgets import (
     QFileDialog, QMessageBox, QWidget, QLabel, QLineEdit,
     QPushButton, QVBoxLayout, QFormLayout, QRadioButton,
     QButtonGroup, QWidgetItem, QSpacerItem
 )
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
 
 
 # Define color constants
@@ -22,65 +19,108 @@ HL_COLOR = "#02a8c3"
 FONT_COLOR = "#fefefe"
 BG_COLOR_ENTRY = "#DEDEDE"
 
+# Scraping progress is shown every PROGRESS_INTERVAL milliseconds instead of after every post
+PROGRESS_INTERVAL = 500 # milliseconds
+
 
 # Define thread for scraping
 class ScrapeThread(QThread):
-    finished = pyqtSignal(list)
-    progress = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(str)
 
 
-    def __init__(self, channel_name, start_date, finish_date, max_sleep, verbose):
+    def __init__(self, channel_name, start_date, finish_date, rate, verbose, save_path):
         super().__init__()
         self.channel_name = channel_name
         self.start_date = start_date
         self.finish_date = finish_date
-        self.max_sleep = max_sleep
+        self.rate = rate
         self.verbose = verbose
-        self.scraping = True
+        self.save_path = save_path
 
+        # Set by the GUI thread, checked by the scraper between pages and posts
+        self.stopping = threading.Event()
+
+        # Progress is read by the GUI timer, the worker never sends a signal per post
+        self.post_count = 0
+        self.first_post = None # (time, date) of the first scraped post
+        self.last_date = None
 
-    def run(self):
-        scraped_data = self.scrape_channel(self.channel_name, self.start_date, self.finish_date, self.max_sleep, self.verbose)
-        self.finished.emit(scraped_data)
 
+    def run(self):
+        # Scraping dependencies are imported in the worker thread, so the window shows up right away
+        from tg_scraper.writer import ParquetBatchWriter
 
-    def scrape_channel(self, channel_name, start_date, finish_date, max_sleep, verbose):
+        # Posts are streamed to the file in row groups, flushed ones are kept if scraping is stopped or fails
+        try:
+            with ParquetBatchWriter(self.save_path) as writer:
+                self.scrape_channel(self.channel_name, self.start_date, self.finish_date, self.rate, self.verbose, writer)
+        except Exception as e:
+            self.failed.emit(repr(e))
+            return
+        self.finished.emit(writer.rows_written)
 
-        channel = tg.TelegramChannelScraper(channel_name)
-        raw = []
 
-        start_datetime_object = datetime.strptime(start_date, '%Y-%m-%d')
-        finish_datetime_object = datetime.strptime(finish_date, '%Y-%m-%d')
+    def scrape_channel(self, channel_name, start_date, finish_date, rate, verbose, writer):
+        from tg_scraper.rate import RateController
+        from tg_scraper.scrape import iter_posts
 
         post_count = 0
+        rate_controller = RateController.for_host('t.me', rate=rate)
 
-        for i, post in enumerate(channel.get_items()):
-            if not self.scraping:
-                break
-
-            if start_datetime_object.date() <= post.date.date() <= finish_datetime_object.date():
-                if i == 0:
-                    print(f"Sample Post: {post.content[:50]}...")
+        # Jump right to the requested date range instead of walking back from the newest post
+        posts = iter_posts(channel_name, start_date, finish_date, verbose, seek=True, rate_controller=rate_controller, stop=self.stopping)
+        try:
+            for post in posts:
+                # The progress timer may read the dates at any moment, so the last date is set before the first post
+                self.last_date = post['date']
+                if post_count == 0:
+                    print(f"Sample Post: {(post['content'] or '')[:50]}...")
+                    self.first_post = (time.monotonic(), post['date'])
 
-                content = post.content if verbose else '#####'
-                raw.append({
-                    'post_id': post.url.split('/')[-1],
-                    'post_url': post.url,
-                    'date': post.date,
-                    'content': content
-                })
+                writer.write(post)
 
                 post_count += 1
-                self.progress.emit(post_count)
-                time.sleep(random.uniform(0, max_sleep))
-            else:
-                break
+                self.post_count = post_count
+
+                if self.stopping.is_set():
+                    break
+        finally:
+            # The iterator is closed in the worker thread, which owns its connection
+            posts.close()
+
+        return post_count
+
+
+    def progress_info(self):
+        """
+        This function estimates the scraping progress. Posts are scraped from newer
+        to older ones, so the share of the date range between the first scraped post
+        and 'start_date' that is already covered tells how much is left.
 
-        return raw
+        Returns:
+            tuple: The number of scraped posts, posts per second and the estimated
+            number of seconds left, or None if it is not known yet.
+        """
+        last_date = self.last_date
+        if self.first_post is None or last_date is None:
+            return self.post_count, 0.0, None
+
+        started, first_date = self.first_post
+        elapsed = time.monotonic() - started
+        speed = self.post_count / elapsed if elapsed > 0 else 0.0
+
+        start = datetime.strptime(self.start_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        total = (first_date - start).total_seconds()
+        done = (first_date - last_date).total_seconds()
+        if total <= 0 or done <= 0:
+            return self.post_count, speed, None
+
+        return self.post_count, speed, elapsed * (total - done) / done
 
 
     def stop(self):
-        self.scraping = False
+        self.stopping.set()
 
 
 # Create icon from base64
@@ -102,12 +142,13 @@ class TelegramScraperApp(QWidget):
         self.initUI()
 
         self.scrape_thread = None
+        self.closing = False
 
 
     def initUI(self):
 
         # Set window properties
-        self.setFixedSize(360, 295)  # width, height
+        self.setFixedSize(360, 320)  # width, height
         self.setWindowTitle('Telegram Posts Scraper')
         self.setWindowFlags(QtCore.Qt.Window)
 
@@ -192,6 +233,18 @@ class TelegramScraperApp(QWidget):
         self.scraping_status_display.setStyleSheet(f"color: {FONT_COLOR}; font-size: 13px;")
         self.form_layout.addRow(self.scraping_status_label, self.scraping_status_display)
 
+        # Add label for scraping speed and the estimated time left
+        self.scraping_speed_label = QLabel('Speed / ETA:')
+        self.scraping_speed_label.setStyleSheet(f"color: {FONT_COLOR}; font-size: 13px;")
+        self.scraping_speed_display = QLabel('-')
+        self.scraping_speed_display.setStyleSheet(f"color: {FONT_COLOR}; font-size: 13px;")
+        self.form_layout.addRow(self.scraping_speed_label, self.scraping_speed_display)
+
+        # Add timer showing the scraping progress while the scrape thread runs
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(PROGRESS_INTERVAL)
+        self.progress_timer.timeout.connect(self.update_scraping_status)
+
         # Set layout for the widget
         self.setLayout(self.form_layout)
 
@@ -227,31 +280,42 @@ class TelegramScraperApp(QWidget):
         if confirm == QMessageBox.No:
             return
 
+        # Choose the output file before scraping, so posts can be streamed to it
+        save_path, _ = QFileDialog.getSaveFileName(self, "Save File", f"tg-posts-{channel_name}-{start_date}-{finish_date}.parquet.gzip", "Parquet files (*.parquet.gzip)")
+        if not save_path:
+            return
+
         # Create and start the scrape thread
-        self.scrape_thread = ScrapeThread(channel_name, start_date, finish_date, 0.1, verbose == 'y')
-        self.scrape_thread.progress.connect(self.update_scraping_status)
+        self.scrape_thread = ScrapeThread(channel_name, start_date, finish_date, 1.0, verbose == 'y', save_path)
         self.scrape_thread.finished.connect(self.handle_scraped_data)
+        self.scrape_thread.failed.connect(self.handle_scraping_error)
         self.scrape_thread.start()
+        self.progress_timer.start()
 
         self.scrape_button.setEnabled(False)
 
 
     # Method to handle scraped data
-    def handle_scraped_data(self, scraped_data):
-        if scraped_data:
-            self.save_data(scraped_data, self.channel_entry.text().strip(), self.start_date_entry.text().strip(), self.finish_date_entry.text().strip())
+    def handle_scraped_data(self, rows_written):
+        self.progress_timer.stop()
+        if self.closing:
+            self.finish_closing()
+            return
+        self.update_scraping_status()
+        if rows_written:
+            QMessageBox.information(self, "Success", f"Data saved as {os.path.basename(self.scrape_thread.save_path)}")
         self.scrape_button.setEnabled(True)
 
 
-    # Method to save scraped data
-    def save_data(self, scraped_data, channel_name, start_date, finish_date):
-        save_path, _ = QFileDialog.getSaveFileName(self, "Save File", "", "Parquet files (*.parquet.gzip)")
-        if not save_path:
+    # Method to handle scraping errors, the posts saved before the error are kept
+    def handle_scraping_error(self, error):
+        self.progress_timer.stop()
+        if self.closing:
+            self.finish_closing()
             return
-
-        table = Table.from_pylist(scraped_data)
-        write_table(table, save_path)
-        QMessageBox.information(self, "Success", f"Data saved as {os.path.basename(save_path)}")
+        self.update_scraping_status()
+        QMessageBox.critical(self, "Scraping Error", f"Scraping stopped: {error}\nThe posts scraped so far are saved in {os.path.basename(self.scrape_thread.save_path)}")
+        self.scrape_button.setEnabled(True)
 
 
     # Method to format date input
@@ -294,15 +358,45 @@ class TelegramScraperApp(QWidget):
 
 
     # Method to update scraping status
-    def update_scraping_status(self, count):
+    def update_scraping_status(self):
+        count, speed, eta = self.scrape_thread.progress_info()
         self.scraping_status_display.setText(str(count))
+        eta_text = str(timedelta(seconds=round(eta))) if eta is not None else '-'
+        self.scraping_speed_display.setText(f"{speed:.1f} posts/s, {eta_text}")
 
 
-    # Method to exit application
-    def exit_application(self):
+    # Method to stop scraping without blocking the window, the scrape thread saves the rest of the batch and reports back
+    def stop_scraping(self):
         if self.scrape_thread and self.scrape_thread.isRunning():
             self.scrape_thread.stop()
-            self.scrape_thread.wait()
+            self.scrape_button.setEnabled(False)
+            self.exit_button.setEnabled(False)
+            self.scraping_speed_display.setText('Stopping...')
+
+
+    # Method to exit application
+    def exit_application(self):
+        self.close()
+
+
+    # Closing the window in any way stops scraping first, so the output file is valid.
+    # The window stays responsive and closes once the scrape thread reports back.
+    def closeEvent(self, event):
+        if self.scrape_thread is None or not self.scrape_thread.isRunning():
+            event.accept()
+            return
+
+        if not self.closing:
+            self.closing = True
+            self.progress_timer.stop()
+            self.stop_scraping()
+        event.ignore()
+
+
+    # Method to close the window once the stopped scrape thread has saved the posts
+    def finish_closing(self):
+        # The thread has emitted its last signal, so it ends right away
+        self.scrape_thread.wait()
         self.close()
 
 
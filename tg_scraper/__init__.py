@@ -0,0 +1,56 @@
+"""
+Shared building blocks of the Telegram Posts Scraper script and application.
+
+The package can be used as a library, e.g.
+
+    from tg_scraper import iter_posts, ParquetBatchWriter
+
+    with ParquetBatchWriter('posts.parquet.gzip') as writer:
+        for post in iter_posts('example_channel', '2024-01-01', '2024-12-31', seek=True):
+            writer.write(post)
+
+or from the command line with 'python -m tg_scraper --help'. The names below
+are imported on first access, so importing the package does not load
+snscrape or pyarrow until they are used.
+"""
+import importlib
+
+
+# Public names and the modules they are defined in
+_EXPORTS = {
+    'iter_posts': 'tg_scraper.scrape',
+    'iter_batches': 'tg_scraper.scrape',
+    'ChannelScraper': 'tg_scraper.channel',
+    'ParquetBatchWriter': 'tg_scraper.writer',
+    'SCHEMA': 'tg_scraper.writer',
+    'Manifest': 'tg_scraper.manifest',
+    'SeenIndex': 'tg_scraper.seen',
+    'SearchIndex': 'tg_scraper.search',
+    'Metrics': 'tg_scraper.metrics',
+    'RateController': 'tg_scraper.rate',
+    'PageCache': 'tg_scraper.cache',
+    'CacheMissError': 'tg_scraper.cache',
+    'scrape_job': 'tg_scraper.batch',
+    'scrape_batch': 'tg_scraper.batch',
+    'scrape_sharded': 'tg_scraper.shard',
+    'JobQueue': 'tg_scraper.jobqueue',
+    'run_daemon': 'tg_scraper.daemon',
+    'audit_channel': 'tg_scraper.audit',
+    'repair_channel': 'tg_scraper.audit',
+    'scrape_range': 'tg_scraper.cli',
+    'scrape_incremental': 'tg_scraper.cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'tg_scraper' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,5 @@
+from tg_scraper.cli import main
+
+
+if __name__ == '__main__':
+    main()
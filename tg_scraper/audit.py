@@ -0,0 +1,327 @@
+from datetime import datetime
+import argparse
+import glob
+import json
+import os
+import re
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow.parquet import ParquetFile
+
+from tg_scraper.dataset import channel_files
+from tg_scraper.writer import BATCH_SIZE, COMPRESSION, SUFFIXES
+
+
+# Number of posts in a t.me channel page, gaps closer than this are repaired in a single walk
+PAGE_SIZE = 20
+
+# Number of gaps and missing dates listed in a printed report
+REPORT_LIMIT = 10
+
+# Collected runs of ids are merged into the ranges once there are more of them than this and the ranges
+MERGE_RUNS = 100000
+
+
+class IdRanges:
+    """
+    This class collects post ids as sorted ranges of consecutive ids and counts
+    the ids added more than once, so the ids of a whole archive take a few ranges
+    of memory instead of one value per post. The runs of consecutive ids of every
+    added array are collected as they come and merged in one sorted pass once
+    the ranges are read, or once there are more than MERGE_RUNS of them.
+    """
+
+    def __init__(self):
+        self._ranges = []
+        self._runs = []
+        self._duplicates = 0
+
+
+    @property
+    def ranges(self):
+        self._merge()
+        return self._ranges
+
+
+    @property
+    def duplicates(self):
+        self._merge()
+        return self._duplicates
+
+
+    def __len__(self):
+        return sum(high - low + 1 for low, high in self.ranges)
+
+
+    def add(self, post_ids):
+        """
+        This function adds an array of post ids, in any order.
+
+        Returns:
+            None
+        """
+        if len(post_ids) == 0:
+            return
+
+        unique = pc.unique(post_ids)
+        self._duplicates += len(post_ids) - len(unique)
+        unique = unique.take(pc.sort_indices(unique))
+
+        # Runs of consecutive ids start where the step from the previous id is not 1,
+        # only their bounds are turned into Python values
+        starts = [0]
+        if len(unique) > 1:
+            steps = pc.subtract(unique[1:], unique[:-1])
+            starts += pc.add(pc.indices_nonzero(pc.not_equal(steps, 1)), 1).to_pylist()
+        ends = [start - 1 for start in starts[1:]] + [len(unique) - 1]
+
+        self._runs.extend(zip(unique.take(starts).to_pylist(), unique.take(ends).to_pylist()))
+
+        # Bound the memory of the collected runs, every merge pays for the runs it merges
+        if len(self._runs) > max(MERGE_RUNS, len(self._ranges)):
+            self._merge()
+
+
+    def _merge(self):
+        # Merge the collected runs into the overlapping or adjacent ranges, counting the overlap as duplicates.
+        # Sorted by their low ends, a run only overlaps the last merged range.
+        if not self._runs:
+            return
+
+        ranges = []
+        for low, high in sorted(self._runs + [tuple(r) for r in self._ranges]):
+            if ranges and low <= ranges[-1][1] + 1:
+                self._duplicates += max(0, min(ranges[-1][1], high) - low + 1)
+                ranges[-1][1] = max(ranges[-1][1], high)
+            else:
+                ranges.append([low, high])
+        self._ranges = ranges
+        self._runs = []
+
+
+    def gaps(self):
+        """
+        This function lists the ids missing between the ranges.
+
+        Returns:
+            list of (low, high) tuples, including both ends.
+        """
+        return [(lower[1] + 1, upper[0] - 1) for lower, upper in zip(self.ranges, self.ranges[1:])]
+
+
+def read_ids_and_dates(path, batch_size=BATCH_SIZE):
+    """
+    This function reads only the 'post_id' and 'date' columns of a parquet file,
+    memory-mapped and one batch at a time, so the memory use does not depend
+    on the file size.
+
+    Returns:
+        This function yields pyarrow.RecordBatch objects.
+    """
+    parquet_file = ParquetFile(path, memory_map=True)
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=['post_id', 'date'], use_threads=False)
+
+
+def audit_channel(channel_name, folder='data'):
+    """
+    This function checks the stored posts of a channel, its output files and
+    dataset partitions, for post id gaps, repeated posts and date coverage.
+    Only the post ids and dates are read, see 'read_ids_and_dates'. Files that
+    cannot be read, e.g. truncated ones, are listed instead of stopping the audit,
+    and the posts read from such a file before the error are counted.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel.
+
+    - folder (str): The folder with the output files. The default value is 'data'.
+
+    Returns:
+        dict with the 'channel', the number of 'files', 'posts', 'unique_posts' and
+        'duplicates', the 'ranges' of stored ids, the 'gaps' between them, the number
+        of 'missing' ids, the 'first_date' and 'last_date', the number of 'days' with
+        posts, the 'missing_dates' without posts between the first and last date and
+        the 'unreadable' files, relative to the folder.
+    """
+    paths = channel_files(folder, channel_name)
+    ids = IdRanges()
+    days = set()
+    posts = 0
+    unreadable = []
+
+    for path in paths:
+        try:
+            for batch in read_ids_and_dates(path):
+                posts += batch.num_rows
+                ids.add(batch.column('post_id'))
+                # Dates are truncated to days before they are formatted, so only the distinct days are formatted
+                days.update(pc.strftime(pc.unique(pc.floor_temporal(batch.column('date'), unit='day')), '%Y-%m-%d').to_pylist())
+        except (OSError, pa.ArrowInvalid):
+            # A broken file must not stop the audit of the other files and channels
+            unreadable.append(os.path.relpath(path, folder))
+
+    gaps = ids.gaps()
+    first_date, last_date = (min(days), max(days)) if days else (None, None)
+
+    missing_dates = []
+    if days:
+        first = datetime.strptime(first_date, '%Y-%m-%d').toordinal()
+        last = datetime.strptime(last_date, '%Y-%m-%d').toordinal()
+        calendar = (datetime.fromordinal(day).strftime('%Y-%m-%d') for day in range(first, last + 1))
+        missing_dates = [day for day in calendar if day not in days]
+
+    return {
+        'channel': channel_name,
+        'files': len(paths),
+        'posts': posts,
+        'unique_posts': len(ids),
+        'duplicates': ids.duplicates,
+        'ranges': ids.ranges,
+        'gaps': gaps,
+        'missing': sum(high - low + 1 for low, high in gaps),
+        'first_date': first_date,
+        'last_date': last_date,
+        'days': len(days),
+        'missing_dates': missing_dates,
+        'unreadable': unreadable,
+    }
+
+
+def repair_channel(report, folder='data', verbose=True, rate=None, fast=True, writer_options=None, dataset=False):
+    """
+    This function scrapes only the post id gaps found by 'audit_channel' into
+    a new 'tg-posts-<channel_name>-repair-<run>' file, see 'run_name', or the dataset partitions.
+    Gaps closer than a page are walked together and the stored posts between them
+    are skipped. The channel index of stored posts is updated with the audited
+    and the repaired posts, see SeenIndex. Posts deleted from the channel leave
+    gaps that cannot be repaired.
+
+    Parameters:
+    - report (dict): The report of the channel, see 'audit_channel'.
+
+    - folder, writer_options, dataset: See 'scrape_range'.
+
+    - verbose (bool): If False, post contents are substituted with '#####'.
+      The default value is True.
+
+    - rate (float): The initial number of requests per second. The default value is RATE.
+
+    - fast (bool): If True, pages are extracted straight into Arrow columns.
+      The default value is True.
+
+    Returns:
+        int: The number of repaired posts.
+    """
+    from tg_scraper.cli import open_writer, run_name
+    from tg_scraper.rate import RateController, RATE
+    from tg_scraper.scrape import iter_batches, iter_posts
+    from tg_scraper.seen import SeenIndex
+
+    if not report['gaps']:
+        return 0
+
+    # Walks of gaps closer than a page overlap, so they are joined
+    walks = [list(report['gaps'][0])]
+    for low, high in report['gaps'][1:]:
+        if low - walks[-1][1] <= PAGE_SIZE:
+            walks[-1][1] = high
+        else:
+            walks.append([low, high])
+
+    seen = SeenIndex(report['channel'], folder)
+    seen.add_ranges(report['ranges'])
+    rate_controller = RateController(rate=rate or RATE)
+
+    writer, _ = open_writer(report['channel'], f"repair-{run_name()}", folder, dataset, writer_options, on_flush=seen.record_batch)
+    with writer:
+        for low, high in walks:
+            options = dict(before=high + 1, stop_at=low - 1, rate_controller=rate_controller)
+            if fast:
+                for batch in iter_batches(report['channel'], report['first_date'], report['last_date'], verbose, seen=seen, **options):
+                    writer.write_batch(batch)
+            else:
+                for post in iter_posts(report['channel'], report['first_date'], report['last_date'], verbose, seen=seen, **options):
+                    writer.write(post)
+
+    # Do not keep empty files around
+    if writer.rows_written == 0 and not dataset:
+        os.remove(writer.path)
+
+    return writer.rows_written
+
+
+def stored_channels(folder='data'):
+    """
+    This function lists the channels with stored posts in a folder.
+
+    Returns:
+        list of str
+    """
+    names = set()
+    for path in glob.glob(os.path.join(folder, 'tg-posts-*')):
+        # Channel names consist of letters, digits and underscores, so the name ends at the first '-'
+        match = re.match(r'tg-posts-(\w+)-', os.path.basename(path))
+        if match and path.endswith(tuple(SUFFIXES.values())):
+            names.add(match.group(1))
+    for path in glob.glob(os.path.join(folder, 'channel=*')):
+        names.add(os.path.basename(path).split('=', 1)[1])
+    return sorted(names)
+
+
+def print_report(report):
+    """
+    This function prints a channel report of 'audit_channel'.
+
+    Returns:
+        None
+    """
+    print(f"🔸 '{report['channel']}': {report['posts']} posts in {report['files']} files")
+    if report['unreadable']:
+        print(f"🔴 Unreadable files: {len(report['unreadable'])}")
+        for path in report['unreadable'][:REPORT_LIMIT]:
+            print(f"    {path}")
+        if len(report['unreadable']) > REPORT_LIMIT:
+            print(f"    ... and {len(report['unreadable']) - REPORT_LIMIT} more")
+    if report['posts'] == 0:
+        return
+
+    print(f"◻️ Post ids: #{report['ranges'][0][0]}-#{report['ranges'][-1][1]}, {report['unique_posts']} unique, {report['duplicates']} duplicates")
+    print(f"◻️ Gaps: {len(report['gaps'])} with {report['missing']} missing ids")
+    for low, high in report['gaps'][:REPORT_LIMIT]:
+        print(f"    #{low}-#{high}" if low < high else f"    #{low}")
+    if len(report['gaps']) > REPORT_LIMIT:
+        print(f"    ... and {len(report['gaps']) - REPORT_LIMIT} more")
+
+    print(f"◻️ Dates: {report['first_date']} to {report['last_date']}, {report['days']} days with posts, {len(report['missing_dates'])} days without")
+    if report['missing_dates']:
+        print(f"    {', '.join(report['missing_dates'][:REPORT_LIMIT])}" + (' ...' if len(report['missing_dates']) > REPORT_LIMIT else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check stored Telegram posts for post id gaps, repeated posts and date coverage, and scrape the missing posts.')
+    parser.add_argument('channels', nargs='*', help='channels to check (all channels in the folder by default)')
+    parser.add_argument('--folder', default='data', help="folder with the output files ('data' by default)")
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    parser.add_argument('--repair', action='store_true', help='scrape the posts of the gaps into a new file per channel')
+    parser.add_argument('--dataset', action='store_true', help="add the repaired posts to the dataset partitions of the folder")
+    parser.add_argument('--mask', action='store_true', help="substitute the contents of repaired posts with '#####'")
+    parser.add_argument('--rate', type=float, help='initial number of page requests per second of the repair')
+    parser.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the repair files ('{COMPRESSION}' by default)")
+    args = parser.parse_args()
+
+    reports = [audit_channel(channel_name, args.folder) for channel_name in args.channels or stored_channels(args.folder)]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print()
+        for report in reports:
+            print_report(report)
+            print()
+
+    if args.repair:
+        for report in reports:
+            if report['gaps']:
+                print(f"🧲 Scraping {report['missing']} missing posts of '{report['channel']}'...")
+                repaired = repair_channel(report, args.folder, not args.mask, args.rate, writer_options=dict(compression=args.compression), dataset=args.dataset)
+                print(f"✔️ Repaired {repaired} posts, the rest of the gaps are deleted posts\n")
@@ -0,0 +1,213 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import argparse
+import csv
+import os
+import threading
+
+from tg_scraper.cache import PageCache
+from tg_scraper.cli import open_writer
+from tg_scraper.metrics import Metrics
+from tg_scraper.rate import RateController, RATE
+from tg_scraper.scrape import iter_batches, iter_posts
+from tg_scraper.writer import BATCH_SIZE, COMPRESSION, SUFFIXES
+
+
+# Number of channels scraped at the same time
+WORKERS = 16
+
+# Number of requests in flight at the same time, shared by all channels
+MAX_REQUESTS = 8
+
+
+def read_jobs(path):
+    """
+    This function reads a jobs file. Every line holds a channel name and, optionally,
+    the first and the last date to scrape in YYYY-MM-DD format, separated by commas:
+
+        channel_name,2024-01-01,2024-12-31
+
+    Missing dates default to the beginning and the end of the current year.
+    Empty lines and lines starting with '#' are skipped.
+
+    Returns:
+        list of (channel_name, start_date, finish_date) tuples
+    """
+    default_start = f"{datetime.today().year}-01-01"
+    default_finish = f"{datetime.today().year}-12-31"
+
+    jobs = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            row = [value.strip() for value in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+
+            channel_name, start_date, finish_date = (row + ['', ''])[:3]
+            jobs.append((channel_name, start_date or default_start, finish_date or default_finish))
+
+    return jobs
+
+
+def job_name(start_date, finish_date, id_range=None):
+    """
+    This function returns the '<start>-<finish>' part of the output file name of a job,
+    or '<start>-<finish>-<low>-<high>' for a job limited to a range of post ids.
+
+    Returns:
+        str
+    """
+    name = f"{start_date}-{finish_date}"
+    if id_range is not None:
+        name += f"-{id_range[0]}-{id_range[1]}"
+    return name
+
+
+def scrape_job(channel_name, start_date, finish_date, folder='data', verbose=True, request_limit=None, rate_controller=None, cache=None, fast=False, metrics=None, writer_options=None, dataset=False, id_range=None, suffix='', stop=None):
+    """
+    This function scrapes a single channel into its own compressed parquet file
+    'tg-posts-<channel>-<start>-<finish>.parquet.gzip' in the folder.
+    If 'fast' is True, pages are extracted straight into Arrow columns, see 'iter_batches'.
+    If 'metrics' is provided, it collects the latencies of the scraping stages.
+    If 'writer_options' is provided, they are passed to ParquetBatchWriter and the
+    file name ends with the suffix of their compression codec instead of '.parquet.gzip'.
+    If 'dataset' is True, posts are added to the channel partitions of a dataset
+    in the folder instead, see DatasetWriter.
+    If 'id_range' is provided, only the posts with ids from its low to its high end
+    (including both) are scraped, into a '<start>-<finish>-<low>-<high>' file.
+    If 'suffix' is provided, it is appended to the file name, e.g. of a temporary file.
+    If 'stop' (threading.Event) is provided, scraping stops once it is set.
+
+    Returns:
+        int: The number of stored posts.
+    """
+    on_timing = metrics.observe if metrics is not None else None
+    options = dict(seek=True)
+    if id_range is not None:
+        options = dict(before=id_range[1] + 1, stop_at=id_range[0] - 1)
+    writer, _ = open_writer(channel_name, job_name(start_date, finish_date, id_range), folder, dataset, writer_options, suffix, on_timing=on_timing)
+
+    with writer:
+        if fast:
+            for batch in iter_batches(channel_name, start_date, finish_date, verbose, request_limit=request_limit, rate_controller=rate_controller, cache=cache, on_timing=on_timing, **options):
+                writer.write_batch(batch)
+                if stop is not None and stop.is_set():
+                    break
+        else:
+            for post in iter_posts(channel_name, start_date, finish_date, verbose, request_limit=request_limit, rate_controller=rate_controller, cache=cache, on_timing=on_timing, **options):
+                writer.write(post)
+                if stop is not None and stop.is_set():
+                    break
+
+    return writer.rows_written
+
+
+def scrape_batch(jobs, folder='data', workers=WORKERS, max_requests=MAX_REQUESTS, rate=RATE, verbose=True, cache=None, fast=False, metrics=None, writer_options=None, dataset=False):
+    """
+    This function scrapes many channels concurrently on a thread pool.
+    All channels share a global cap on the number of requests in flight and
+    a single adaptive rate controller, so their requests per second add up
+    to one budget for the host.
+
+    Parameters:
+    - jobs (list): (channel_name, start_date, finish_date) tuples, see 'read_jobs'.
+
+    - folder (str): The output folder. The default value is 'data'.
+
+    - workers (int): The number of channels scraped at the same time.
+      The default value is WORKERS.
+
+    - max_requests (int): The number of requests in flight at the same time.
+      The default value is MAX_REQUESTS.
+
+    - rate (float): The initial number of requests per second of all channels together.
+      The default value is RATE.
+
+    - verbose (bool): If False, post contents are substituted with '#####'.
+      The default value is True.
+
+    - cache (PageCache): If provided, pages are read from and stored in the cache.
+      The default value is None.
+
+    - fast (bool): If True, pages are extracted straight into Arrow columns.
+      The default value is False.
+
+    - metrics (Metrics): If provided, it collects the latencies of the scraping
+      stages of all channels. The default value is None.
+
+    - writer_options (dict): Keyword arguments of ParquetBatchWriter, e.g.
+      'compression', 'compression_level' or 'batch_size'. The default value is None.
+
+    - dataset (bool): If True, posts are added to the channel partitions of a dataset
+      in the folder, see DatasetWriter. The default value is False.
+
+    Returns:
+        dict: The number of scraped posts, or the raised exception, for every job.
+    """
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    request_limit = threading.BoundedSemaphore(max_requests)
+    rate_controller = RateController(rate=rate)
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scrape_job, *job, folder, verbose, request_limit, rate_controller, cache, fast, metrics, writer_options, dataset): job for job in jobs}
+
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                results[job] = future.result()
+                print(f"✔️ Scraped {results[job]} posts from '{job[0]}' between {job[1]} and {job[2]}")
+            except Exception as e:
+                # A failed channel should not stop the others
+                results[job] = e
+                print(f"🔴 Failed to scrape '{job[0]}' between {job[1]} and {job[2]}: {e!r}")
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape many Telegram channels listed in a jobs file concurrently.')
+    parser.add_argument('jobs', help='a file with one "channel_name[,start_date[,finish_date]]" line per channel')
+    parser.add_argument('--folder', default='data', help="output folder ('data' by default)")
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f'channels scraped at the same time ({WORKERS} by default)')
+    parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS, help=f'requests in flight at the same time ({MAX_REQUESTS} by default)')
+    parser.add_argument('--rate', type=float, default=RATE, help=f'initial requests per second of all channels together, adjusted to the server responses ({RATE} by default)')
+    parser.add_argument('--mask', action='store_true', help="substitute post contents with '#####'")
+    parser.add_argument('--cache', help='folder to cache fetched pages in')
+    parser.add_argument('--replay', action='store_true', help='only read pages from the cache, without network requests')
+    parser.add_argument('--fast', action='store_true', help='extract pages straight into Arrow columns with lxml')
+    parser.add_argument('--dataset', action='store_true', help="add the posts to the 'channel=<name>/year=<Y>/month=<M>' dataset partitions in the output folder, skipping stored posts")
+    parser.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the output files ('{COMPRESSION}' by default)")
+    parser.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    parser.add_argument('--row-group-size', type=int, default=BATCH_SIZE, help=f'posts in a single row group of the output files ({BATCH_SIZE} by default)')
+    parser.add_argument('--metrics-file', help='file to export the stage metrics to while running, as JSON if it ends with .json, else in the Prometheus text format')
+    parser.add_argument('--metrics-port', type=int, help='local port to serve the stage metrics on, at /metrics and /metrics.json')
+    args = parser.parse_args()
+
+    if args.replay and not args.cache:
+        parser.error('--replay requires --cache')
+
+    if args.row_group_size < 1:
+        parser.error(f"invalid row group size {args.row_group_size}, expected at least 1 post")
+
+    cache = PageCache(args.cache, replay=args.replay) if args.cache else None
+    jobs = read_jobs(args.jobs)
+    print(f"\n🧲 Scraping {len(jobs)} channels with up to {args.max_requests} requests in flight...\n")
+
+    metrics = Metrics()
+    writer_options = dict(compression=args.compression, compression_level=args.compression_level, batch_size=args.row_group_size)
+    stop_export = metrics.start_export(args.metrics_file) if args.metrics_file else None
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+
+    try:
+        results = scrape_batch(jobs, args.folder, args.workers, args.max_requests, args.rate, not args.mask, cache, args.fast, metrics, writer_options, args.dataset)
+    finally:
+        if stop_export is not None:
+            stop_export()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    failed = sum(isinstance(result, Exception) for result in results.values())
+    print(f"\n🔽 {len(jobs) - failed} of {len(jobs)} channels saved in '{args.folder}' folder")
@@ -0,0 +1,143 @@
+import gzip
+import json
+import os
+import threading
+import time
+
+
+# Maximum size of the cache folder
+MAX_SIZE = 512 * 1024 * 1024 # bytes
+
+# Number of seconds a cached head page (the newest posts of a channel) stays valid
+HEAD_TTL = 600
+
+
+class CacheMissError(Exception):
+    """
+    This exception is raised in replay mode when a page is not in the cache.
+    """
+
+
+class PageCache:
+    """
+    This class stores raw t.me channel pages on disk, keyed by the channel name
+    and the 'before' cursor, as gzip-compressed files.
+
+    Pages below a cursor never change, so they do not expire, while the head page
+    of a channel is fetched again once it is older than 'head_ttl' seconds. When
+    the folder grows over 'max_size' bytes, the least recently used pages are removed.
+    In replay mode nothing is fetched from the network: every page has to come from
+    the cache, else CacheMissError is raised.
+
+    Parameters:
+    - folder (str): The cache folder. The default value is 'cache'.
+
+    - max_size (int): The maximum size of the cache in bytes. The default value is MAX_SIZE.
+
+    - head_ttl (float): The number of seconds a head page stays valid.
+      The default value is HEAD_TTL.
+
+    - replay (bool): If True, pages are only read from the cache.
+      The default value is False.
+    """
+
+    def __init__(self, folder='cache', max_size=MAX_SIZE, head_ttl=HEAD_TTL, replay=False):
+        self.folder = folder
+        self.max_size = max_size
+        self.head_ttl = head_ttl
+        self.replay = replay
+        self._lock = threading.Lock()
+        self._size = sum(entry[2] for entry in self._entries())
+
+
+    def __reduce__(self):
+        # Locks cannot be sent to other processes, so a copy is created from the settings
+        return (PageCache, (self.folder, self.max_size, self.head_ttl, self.replay))
+
+
+    def _path(self, channel_name, before):
+        return os.path.join(self.folder, channel_name, f"{before if before is not None else 'head'}.html.gz")
+
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+
+    def get(self, channel_name, before=None):
+        """
+        This function reads a cached page.
+
+        Returns:
+            (url, text) tuple, or None if the page is not cached or has expired.
+        """
+        path = self._path(channel_name, before)
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                text = f.read()
+        except (FileNotFoundError, EOFError, OSError, ValueError):
+            if self.replay:
+                raise CacheMissError(f"Page of '{channel_name}' before {before} is not cached")
+            return None
+
+        if before is None and not self.replay and time.time() - header['fetched'] > self.head_ttl:
+            return None
+
+        # The modification time marks the last use for the LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return header['url'], text
+
+
+    def put(self, channel_name, before, url, text):
+        """
+        This function stores a page and evicts the least recently used pages
+        if the cache has grown over its maximum size.
+
+        Returns:
+            None
+        """
+        path = self._path(channel_name, before)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write the page in one step, so a reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'url': url, 'fetched': time.time()}) + '\n')
+            f.write(text)
+
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path) - old_size
+
+            if self._size > self.max_size:
+                self._evict()
+
+
+    def _evict(self):
+        # Remove the least recently used pages until the cache is 10% below its maximum size
+        entries = sorted(self._entries())
+        self._size = sum(entry[2] for entry in entries)
+
+        for _, path, size in entries:
+            if self._size <= 0.9 * self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
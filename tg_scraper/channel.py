@@ -0,0 +1,269 @@
+import time
+import urllib.parse
+
+import bs4
+
+import snscrape.base
+import snscrape.modules.telegram as tg
+
+from tg_scraper.extract import extract_page
+from tg_scraper.rate import RateController
+
+
+# Number of extra attempts of a throttled (429) or failed (5xx) request
+RETRIES = 5
+
+
+def post_id(post):
+    """
+    This function returns the id of a Telegram post, the last part of its url.
+
+    Returns:
+        int
+    """
+    return int(post.url.split('/')[-1])
+
+
+class ChannelScraper(tg.TelegramChannelScraper):
+    """
+    This class is a Telegram channel scraper that can start from an arbitrary post
+    instead of the newest one, using the t.me 'before=<post_id>' pagination.
+
+    Parameters:
+    - name (str): The name of the Telegram channel to scrape.
+
+    - before (int): If provided, scraping starts from the newest post
+      with an id lower than this value. The default value is None.
+
+    - request_limit (threading.Semaphore): If provided, every request holds it
+      while in flight, so scrapers sharing it never exceed its number of
+      concurrent requests. The default value is None.
+
+    - rate_controller (RateController): The controller throttling the requests.
+      The default value is the controller shared by all scrapers of t.me in the process.
+
+    - cache (PageCache): If provided, pages are read from and stored in the cache.
+      The default value is None.
+
+    - base_url (str): The address of the t.me server, it can be replaced with
+      a local server for benchmarks. The default value is 'https://t.me'.
+
+    - on_timing (callable): If provided, it is called with the stage name ('fetch'
+      or 'parse'), its duration in seconds and the number of pages (1) for every page,
+      see Metrics.observe. The default value is None.
+    """
+
+    def __init__(self, name, before=None, request_limit=None, rate_controller=None, cache=None, base_url='https://t.me', on_timing=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.before = before
+        self.request_limit = request_limit
+        self.rate_controller = rate_controller or RateController.for_host(urllib.parse.urlsplit(base_url).netloc)
+        self.cache = cache
+        self.base_url = base_url
+        self.on_timing = on_timing
+
+
+    def _request(self, *args, **kwargs):
+        for attempt in range(RETRIES + 1):
+            # Wait for the rate controller before taking a slot of the concurrency limit
+            self.rate_controller.acquire()
+            start = time.monotonic()
+
+            try:
+                if self.request_limit is None:
+                    r = super()._request(*args, **kwargs)
+                else:
+                    with self.request_limit:
+                        r = super()._request(*args, **kwargs)
+            except snscrape.base.ScraperException:
+                self.rate_controller.record(None, time.monotonic() - start)
+                raise
+
+            self.rate_controller.record(r.status_code, time.monotonic() - start)
+
+            # Throttled and failed requests are repeated after the controller's backoff
+            if r.status_code != 429 and r.status_code < 500:
+                break
+
+        return r
+
+
+    def _page_url(self, before=None):
+        if before is None:
+            return f'{self.base_url}/s/{self._name}'
+        return f'{self.base_url}/s/{self._name}?before={before}'
+
+
+    def _fetch_page(self, before=None):
+        cached = self.cache.get(self._name, before) if self.cache is not None else None
+        if cached is not None:
+            url, text = cached
+        else:
+            r = self._get(self._page_url(before), headers=self._headers)
+            if r.status_code != 200:
+                raise snscrape.base.ScraperException(f'Got status code {r.status_code}')
+            url, text = r.url, r.text
+            if self.cache is not None:
+                self.cache.put(self._name, before, url, text)
+
+        return url, text
+
+
+    def _timed(self, stage, start):
+        if self.on_timing is not None:
+            self.on_timing(stage, time.perf_counter() - start, 1)
+
+
+    def get_items(self):
+        for page in self.get_pages(self.before):
+            yield from page
+
+
+    def get_page(self, before=None):
+        """
+        This function fetches a single page of posts.
+
+        Parameters:
+        - before (int): If provided, the page holds the posts right below this post id,
+          else the newest posts of the channel. The default value is None.
+
+        Returns:
+            list of TelegramPost objects, newest first. The list is empty
+            if there are no posts or the channel has no public post list.
+        """
+        start = time.perf_counter()
+        url, text = self._fetch_page(before)
+        self._timed('fetch', start)
+
+        # Channels without public posts redirect away from the '/s/' post list
+        if '/s/' not in url:
+            return []
+
+        start = time.perf_counter()
+        posts = list(self._soup_to_items(bs4.BeautifulSoup(text, 'lxml'), url))
+        self._timed('parse', start)
+
+        return posts
+
+
+    def get_page_batch(self, before=None, verbose=True):
+        """
+        This function fetches a single page of posts and extracts it straight
+        into Arrow columns, see 'extract_page'.
+
+        Parameters:
+        - before (int): If provided, the page holds the posts right below this post id,
+          else the newest posts of the channel. The default value is None.
+
+        - verbose (bool): If False, post contents are substituted with '#####'.
+          The default value is True.
+
+        Returns:
+            pyarrow.RecordBatch with the posts of the page, newest first, or None
+            if there are no posts or the channel has no public post list.
+        """
+        start = time.perf_counter()
+        url, text = self._fetch_page(before)
+        self._timed('fetch', start)
+
+        if '/s/' not in url:
+            return None
+
+        start = time.perf_counter()
+        batch = extract_page(text, verbose)
+        self._timed('parse', start)
+
+        return batch if batch.num_rows else None
+
+
+    def get_batches(self, before=None, verbose=True):
+        """
+        This function walks the channel page by page, from newer to older posts,
+        like 'get_pages', but yields pages as Arrow record batches.
+
+        Returns:
+            This function yields pyarrow.RecordBatch objects, newest posts first.
+        """
+        while True:
+            batch = self.get_page_batch(before, verbose)
+            if batch is None:
+                return
+
+            yield batch
+
+            before = int(batch.column('post_id')[-1].as_py())
+            if before <= 1:
+                return
+
+
+    def get_pages(self, before=None):
+        """
+        This function walks the channel page by page, from newer to older posts.
+
+        Parameters:
+        - before (int): If provided, the walk starts right below this post id,
+          else from the newest posts of the channel. The default value is None.
+
+        Returns:
+            This function yields lists of TelegramPost objects, newest first.
+        """
+        while True:
+            page = self.get_page(before)
+            if not page:
+                return
+
+            yield page
+
+            # The oldest post of a page is the cursor of the next one
+            before = post_id(page[-1])
+            if before <= 1:
+                return
+
+
+    def newest_post_id(self):
+        """
+        This function returns the id of the newest post in the channel.
+
+        Returns:
+            int or None: None if the channel has no public posts.
+        """
+        page = self.get_page()
+        return post_id(page[0]) if page else None
+
+
+    def seek(self, finish_date):
+        """
+        This function binary searches the channel for the newest post published
+        on or before 'finish_date', using one page request per step, so only
+        about log2(number of posts) pages are fetched before reaching it.
+
+        Parameters:
+        - finish_date (datetime.date): The last date of the requested range.
+
+        Returns:
+            int or None: The 'before' value to start scraping from,
+            or None if the newest posts are already within the range.
+        """
+        page = self.get_page()
+        if not page or page[0].date.date() <= finish_date:
+            return None
+
+        # The newest post below 'low' is known to be old enough, the one below 'high' is not
+        low, high = 1, post_id(page[-1]) + 1
+
+        while True:
+            # Stop as soon as a page holds the boundary, posts in a page are newest first
+            for newer, older in zip(page, page[1:]):
+                if newer.date.date() > finish_date >= older.date.date():
+                    return post_id(older) + 1
+
+            if high - low <= 1:
+                return low
+
+            middle = (low + high) // 2
+            page = self.get_page(before=middle)
+
+            if not page or page[0].date.date() <= finish_date:
+                low = middle
+            else:
+                high = post_id(page[-1]) + 1
@@ -0,0 +1,568 @@
+"""
+Command line interface of the Telegram Posts Scraper.
+
+Heavy dependencies (snscrape, pyarrow, lxml) are only imported by the functions
+that need them, so 'python -m tg_scraper --help' and argument errors return
+right away, and short scrape jobs do not pay for imports they never use.
+"""
+from datetime import date
+from datetime import datetime, timedelta
+import argparse
+import os
+import signal
+import sys
+import time
+import uuid
+
+
+# Initial number of page requests per second, adjusted to the server responses
+RATE = 1.0
+
+# Metrics of a run are exported every METRICS_INTERVAL seconds
+METRICS_INTERVAL = 10 # seconds
+
+# Compression codecs of the output files, the keys of tg_scraper.writer.SUFFIXES,
+# listed here to parse the arguments without importing pyarrow
+COMPRESSIONS = ('gzip', 'zstd', 'snappy', 'brotli', 'lz4', 'none')
+
+# Environment variable with the secret key of content hashes
+HASH_KEY_VARIABLE = 'TG_SCRAPER_HASH_KEY'
+
+
+def metrics_file(channel_name, folder='data'):
+    """
+    This function returns the default path of the metrics file of a channel.
+
+    Returns:
+        str
+    """
+    return os.path.join(folder, f"tg-metrics-{channel_name}.prom")
+
+
+def scrape_channel(channel_name, start_date, finish_date, rate=RATE, verbose=True, writer=None, before=None, stop_at=None, seek=False, metrics=None, cache=None, fast=False, seen=None, stop_after=None, on_end=None):
+    """
+    This function scrapes a specified Telegram channel for posts.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel to scrape.
+
+    - start_date (str): The date from which to start scraping posts.
+      The date should be in the format 'YYYY-MM-DD'.
+
+    - finish_date (str): The date up to which (including it) the posts will be scraped.
+      The date should be in the format 'YYYY-MM-DD'.
+
+    - rate (float): The initial number of page requests per second. Requests are
+      throttled by an adaptive rate controller to avoid overloading the server
+      or getting blocked: the rate grows while responses are healthy and backs off
+      on throttled, failed or slow responses. The default value is 1.0.
+
+    - verbose (bool): If False, the function will substitute post content with '#####'.
+      The default value is True.
+
+    - writer (ParquetBatchWriter): If provided, posts are streamed to the writer
+      in row-group batches instead of being kept in memory.
+      The default value is None.
+
+    - before (int): If provided, scraping starts from the newest post with an id
+      lower than this value instead of the newest post in the channel.
+      The default value is None.
+
+    - stop_at (int): If provided, scraping stops at the post with this id or lower,
+      which is not stored. The default value is None.
+
+    - seek (bool): If True and 'before' is not provided, the function binary searches
+      for the newest post published on or before 'finish_date' and starts from it,
+      instead of paging through all newer posts. The default value is False.
+
+    - metrics (Metrics): If provided, it collects the latencies of the scraping stages.
+      The default value is None.
+
+    - cache (PageCache): If provided, pages are read from and stored in the cache.
+      The default value is None.
+
+    - fast (bool): If True, pages are extracted straight into Arrow columns, see
+      'iter_batches'. It requires a writer. The default value is False.
+
+    - seen (SeenIndex): If provided, posts already stored in the index are skipped.
+      The default value is None.
+
+    - stop_after (int): If provided with 'seen', the walk jumps below the stored range
+      of this many consecutive stored posts. The default value is None.
+
+    - on_end (callable): If provided, it is called with how the walk ended, see 'iter_posts'.
+      The default value is None.
+
+    Returns:
+    - This function returns a list of posts from the specified Telegram channel.
+      Each message is represented as a dictionary with keys for different attributes
+      of the message (post_id, date, content).
+      The list is empty if the posts were streamed to a writer.
+    """
+    from tg_scraper.rate import RateController
+    from tg_scraper.scrape import iter_batches, iter_posts
+
+    # Display target channel name
+    print(f"\n🧲 Target Telegram channel >>> '{channel_name}'\n")
+
+    # Empty list will be filled with dictionaries, unless posts are streamed to a writer
+    raw = []
+    post_count = 0
+
+    # Start the timer
+    start_time = time.time()
+
+    rate_controller = RateController.for_host('t.me', rate=rate)
+    on_timing = metrics.observe if metrics is not None else None
+    options = dict(before=before, stop_at=stop_at, seek=seek, rate_controller=rate_controller, cache=cache, on_timing=on_timing, seen=seen, stop_after=stop_after, on_end=on_end)
+
+    # Pages extracted into Arrow columns go to the writer as they are, posts are stored one by one
+    if fast:
+        batches = iter_batches(channel_name, start_date, finish_date, verbose, **options)
+        store = writer.write_batch
+        samples = ((batch, batch.slice(0, 1).to_pylist()[0]) for batch in batches)
+    else:
+        posts = iter_posts(channel_name, start_date, finish_date, verbose, **options)
+        store = writer.write if writer is not None else raw.append
+        samples = ((post, post) for post in posts)
+
+    # Iterate over posts within the date range
+    for item, post in samples:
+
+        # Display contents of the first post
+        if post_count == 0:
+            print('🔸 Output sample:')
+            print(f"◻️ Post #{post['post_id']}:")
+            print(f"◻️ URL: {post['post_url']}")
+            print(f"◻️ Date: {post['date']}")
+            print(f"◻️ Content: {(post['content'] or '')[:50]}...")
+            print(f"\n⏰ Scraping posts between {start_date} and {finish_date} starting at {rate} requests per second...\n")
+
+        # Store posts if they satisfy the conditions
+        store(item)
+        post_count += item.num_rows if fast else 1
+
+    # Total loop time
+    elapsed_time_total = time.time() - start_time
+
+    def post_download_speed():
+        """
+        This function returns the approximate number of 'appended' posts per minute.
+
+        Returns:
+            int
+        """
+        if elapsed_time_total == 0:
+            return 0
+
+        # Calculate approximate speed: posts / elapsed minutes = posts per minute
+        return int(60 * post_count / elapsed_time_total)
+
+    print(f"✔️ Successfully scraped {post_count} posts from '{channel_name}' Telegram channel.")
+    print(f"🔹 Script took {elapsed_time_total:.0f} seconds to run.")
+    print(f"🔹 The approximate scraping speed was {post_download_speed()} posts per minute.")
+    return raw
+
+
+def print_metrics(metrics):
+    """
+    This function displays the time spent in every scraping stage, to tell
+    whether a slow run was caused by the network, parsing or disk.
+
+    Returns:
+        None
+    """
+    print("\n🔸 Time spent per stage:")
+    for stage, summary in metrics.to_dict()['stages'].items():
+        print(f"◻️ {stage:<6} {summary['seconds']:>8.2f} s in {summary['count']} runs, p50 <= {summary['p50']} s, p99 <= {summary['p99']} s")
+
+
+def run_name():
+    """
+    This function returns a unique name of a scraping run, its start time and a random
+    suffix, so runs started in the same second never write to the same file.
+
+    Returns:
+        str: '<YYYYmmddTHHMMSS>-<8 hex digits>'
+    """
+    return f"{datetime.today():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def output_file_name(channel_name, name, writer_options=None):
+    """
+    This function returns the name of the 'tg-posts-<channel_name>-<name>' output file,
+    with the suffix of the compression codec in 'writer_options'.
+
+    Returns:
+        str
+    """
+    from tg_scraper.writer import COMPRESSION, file_suffix
+    return f"tg-posts-{channel_name}-{name}{file_suffix((writer_options or {}).get('compression', COMPRESSION))}"
+
+
+def open_writer(channel_name, name, folder='data', dataset=False, writer_options=None, suffix='', **kwargs):
+    """
+    This function opens the writer of a scraping run: a ParquetBatchWriter of the
+    'tg-posts-<channel_name>-<name>' file, with the suffix of the compression codec
+    and then 'suffix', e.g. of a temporary file, or a DatasetWriter of the channel
+    partitions if 'dataset' is True.
+    'writer_options' and the rest of the keyword arguments are passed to the writer.
+
+    Returns:
+        tuple: The writer and its file or folder name in 'folder'.
+    """
+    writer_options = {**(writer_options or {}), **kwargs}
+
+    if dataset:
+        from tg_scraper.dataset import DatasetWriter
+        writer = DatasetWriter(folder, channel_name, **writer_options)
+        return writer, os.path.relpath(writer.path, folder)
+
+    from tg_scraper.writer import ParquetBatchWriter
+    output_name = output_file_name(channel_name, name, writer_options) + suffix
+    return ParquetBatchWriter(os.path.join(folder, output_name), **writer_options), output_name
+
+
+def open_search_index(folder, enabled):
+    """
+    This function opens the full-text index of the output folder if it is enabled.
+
+    Returns:
+        SearchIndex or None
+    """
+    if not enabled:
+        return None
+
+    from tg_scraper.search import SearchIndex
+    return SearchIndex(folder)
+
+
+def chain(*callbacks):
+    """
+    This function combines callbacks, e.g. 'on_flush' handlers, into one
+    that calls all of them in order.
+
+    Returns:
+        callable
+    """
+    def call(*args):
+        for callback in callbacks:
+            callback(*args)
+    return call
+
+
+def scrape_range(channel_name, start_date, finish_date, verbose=True, rate=RATE, folder='data', cache=None, fast=False, metrics_path=None, writer_options=None, dataset=False, timezone=None, skip_seen=False, search_index=False):
+    """
+    This function streams the posts of a channel within a date range into
+    a compressed parquet file in row groups of BATCH_SIZE posts, so the whole
+    channel is never held in memory. The output file name is based on the
+    input parameters.
+
+    Parameters:
+    - channel_name, start_date, finish_date, verbose, rate, cache, fast: See 'scrape_channel'.
+
+    - folder (str): The folder of the output file. The default value is 'data'.
+
+    - metrics_path (str): The file the stage metrics are exported to while scraping.
+      The default value is 'tg-metrics-<channel_name>.prom' in 'folder'.
+
+    - writer_options (dict): Keyword arguments of ParquetBatchWriter, e.g.
+      'compression', 'compression_level' or 'batch_size' (the row group size).
+      The output file name ends with the suffix of the compression codec.
+      The default value is None.
+
+    - dataset (bool): If True, posts are added to the 'channel=<name>/year=<Y>/month=<M>'
+      partitions of a dataset in 'folder', without the posts already stored there,
+      see DatasetWriter. The default value is False.
+
+    - timezone (str): If provided, 'start_date' and 'finish_date' are dates in this
+      timezone instead of UTC, e.g. 'Europe/Kyiv'. One more day is scraped on both
+      sides of the range and the posts are filtered exactly on the row groups, see
+      'date_window'. The default value is None.
+
+    - skip_seen (bool): If True, posts stored by previous runs are not scraped again and
+      the walk jumps below a run of STOP_AFTER stored posts, see SeenIndex. The index of
+      stored posts is updated in any case. The default value is False.
+
+    - search_index (bool): If True, the contents of the written posts are added to the
+      full-text index of 'folder', see SearchIndex. The default value is False.
+
+    Returns:
+        str: The path of the output file, or of the channel folder of the dataset.
+    """
+    from tg_scraper.metrics import Metrics
+    from tg_scraper.seen import SeenIndex, STOP_AFTER
+
+    # Scrape the UTC dates overlapping the range and keep the posts of its local dates
+    scrape_start, scrape_finish = start_date, finish_date
+    if timezone:
+        from tg_scraper.transform import date_window
+        writer_options = {**(writer_options or {})}
+        writer_options['transforms'] = [date_window(start_date, finish_date, timezone)] + writer_options.get('transforms', [])
+        scrape_start = (datetime.strptime(start_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        scrape_finish = (datetime.strptime(finish_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    # Export the run metrics while scraping
+    metrics = Metrics()
+    stop_export = metrics.start_export(metrics_path or metrics_file(channel_name, folder), METRICS_INTERVAL)
+
+    # Stream scraped data into a compressed parquet file, the flushed row groups are kept if scraping is interrupted or killed
+    search = open_search_index(folder, search_index)
+    try:
+        seen = SeenIndex.load(channel_name, folder)
+
+        # An earlier file of the same range is overwritten, so its posts are dropped from the index,
+        # posts stored in other files as well are scraped again rather than missed
+        previous = os.path.join(folder, output_file_name(channel_name, f"{start_date}-{finish_date}", writer_options))
+        if not dataset and seen.ranges:
+            import pyarrow as pa
+            from pyarrow.parquet import read_table
+            from tg_scraper.writer import segment_paths
+            for path in [previous] + segment_paths(previous):
+                try:
+                    seen.remove(read_table(path, columns=['post_id']).column('post_id').to_pylist())
+                except (FileNotFoundError, pa.ArrowInvalid):
+                    # Nothing readable is stored in a missing file or one left unfinished by an older version
+                    pass
+            seen.save()
+
+        writer, output_name = open_writer(channel_name, f"{start_date}-{finish_date}", folder, dataset, writer_options, on_timing=metrics.observe)
+        with writer:
+            writer.on_flush = chain(seen.record_batch, *([search.recorder(channel_name)] if search is not None else []))
+
+            scrape_channel(channel_name, scrape_start, scrape_finish, rate, verbose, writer=writer, seek=True, metrics=metrics, cache=cache, fast=fast,
+                           seen=seen if skip_seen else None, stop_after=STOP_AFTER)
+    finally:
+        stop_export()
+        if search is not None:
+            search.close()
+
+    print_metrics(metrics)
+
+    print(f"\n🔹 The dataset has {writer.rows_written} rows and {len(writer.file_schema)} columns")
+
+    print(f"\n🔽 Dataset saved in '{folder}' folder as '{output_name}'")
+    return os.path.join(folder, output_name)
+
+
+def scrape_incremental(channel_name, start_date, verbose=True, rate=RATE, folder='data', cache=None, fast=False, metrics_path=None, writer_options=None, dataset=False, skip_seen=False, search_index=False):
+    """
+    This function scrapes only the posts missing from previous runs: the posts newer
+    than the channel checkpoint and the gaps left by interrupted runs. New posts are
+    streamed into a separate 'tg-posts-<channel_name>-<run>' compressed parquet file,
+    see 'run_name', and the channel manifest is
+    updated after every flushed row group, so an interrupted run resumes from
+    the last flushed post.
+
+    Parameters:
+    - channel_name, start_date, verbose, rate, cache, fast: See 'scrape_channel'.
+
+    - folder, metrics_path, writer_options, dataset, skip_seen, search_index: See 'scrape_range'.
+
+    Returns:
+        str or None: The path of the output file, or of the channel folder of the dataset,
+        None if no new posts were found.
+    """
+    from tg_scraper.manifest import Manifest
+    from tg_scraper.metrics import Metrics
+    from tg_scraper.seen import SeenIndex, STOP_AFTER
+
+    seen = SeenIndex.load(channel_name, folder)
+    manifest = Manifest.load(channel_name, folder)
+    if manifest.max_post_id is not None:
+        print(f"\n🔹 Found posts #{manifest.min_post_id}-#{manifest.max_post_id} from {manifest.first_date} to {manifest.last_date} scraped before")
+
+    # Export the run metrics while scraping
+    metrics = Metrics()
+    stop_export = metrics.start_export(metrics_path or metrics_file(channel_name, folder), METRICS_INTERVAL)
+
+    # Walk every missing range from newer to older posts, there is no upper date limit for new posts
+    search = open_search_index(folder, search_index)
+    try:
+        # The new posts always go into a separate file, or new files of the dataset partitions
+        on_flush = chain(manifest.record_batch, seen.record_batch, *([search.recorder(channel_name)] if search is not None else []))
+        writer, output_name = open_writer(channel_name, run_name(), folder, dataset, writer_options, on_flush=on_flush, on_timing=metrics.observe)
+        if not dataset:
+            manifest.add_file(output_name)
+
+        with writer:
+            for before, stop_at in manifest.tasks(start_date):
+                manifest.begin(before)
+                ends = []
+                scrape_channel(channel_name, start_date, date.today().isoformat(), rate, verbose, writer=writer, before=before, stop_at=stop_at, metrics=metrics, cache=cache, fast=fast,
+                               seen=seen if skip_seen else None, stop_after=STOP_AFTER, on_end=ends.append)
+                writer.flush()
+
+                # Close the gap below the walk only if it reached the stored posts, not the start date
+                manifest.complete(stop_at, ends[-1] if ends else None, start_date)
+    finally:
+        stop_export()
+        if search is not None:
+            search.close()
+
+    print_metrics(metrics)
+
+    # Do not keep empty files around
+    if writer.rows_written == 0:
+        if not dataset:
+            os.remove(writer.path)
+            manifest.files.remove(output_name)
+            manifest.save()
+        print("\n🔹 No new posts were found.")
+        return None
+
+    print(f"\n🔹 The dataset has {writer.rows_written} rows and {len(writer.file_schema)} columns")
+
+    print(f"\n🔽 Dataset saved in '{folder}' folder as '{output_name}'")
+    return os.path.join(folder, output_name)
+
+
+def prompt_args():
+    """
+    This function asks the user for the scraping parameters one by one,
+    the way the script worked before it accepted command line arguments.
+
+    Returns:
+        argparse.Namespace with the same attributes as 'parse_args' returns.
+    """
+    # Channel name, use the XXXX part in 'https://web.telegram.org/k/#@XXXX'
+    channel_name = str(input("\n🔸 Enter a channel name to scrape, use the XXXX part in 'https://web.telegram.org/k/#@XXXX': ").strip())
+
+    # Check for input
+    if len(channel_name) == 0:
+        sys.exit('\n🔴 A channel name was not provided. Exiting program.')
+
+    # Lower date boundary. Posts before it are not included
+    start_date = str(input("🔸 Enter the first date to begin scraping from, in YYYY-MM-DD format (beginning of the current year by default): ").strip() or f"{datetime.today().year}-01-01")
+
+    # Upper date boundary. Posts after it are not included
+    finish_date = str(input("🔸 Enter the last date to scrape, in YYYY-MM-DD format (end of the current year by default): ").strip() or f"{datetime.today().year}-12-31")
+
+    # Include posts contents in the output file if 'y', else mask posts with '#####'
+    verbose = str(input("🔸 Do you want to include posts contents in the output file? y / n ('yes' by default): ").strip() or 'y')
+
+    # Only scrape posts newer than the previous run and fill gaps of interrupted runs if 'y'
+    incremental = str(input("🔸 Do you want to only scrape posts missing from previous runs? y / n ('no' by default): ").strip() or 'n')
+
+    if verbose not in ('y', 'n') or incremental not in ('y', 'n'):
+        sys.exit('\n🔴 Received an invalid response. Exiting program.')
+
+    args = parse_args([channel_name, '--start', start_date, '--finish', finish_date])
+    args.mask = verbose == 'n'
+    args.incremental = incremental == 'y'
+
+    # Confirm the choice before proceeding with scraping posts
+    if args.incremental:
+        print(f"\nYou are about to scrape all {channel_name} posts from {start_date} missing from previous runs.")
+    else:
+        print(f"\nYou are about to scrape all {channel_name} posts from {start_date} to {finish_date}.")
+    choice = str(input('🔸 Are you sure you want to continue? y / n: ')).lower()
+
+    if choice == 'n':
+        sys.exit('Exiting program')
+    elif choice != 'y':
+        sys.exit('\n🔴 Received an invalid response. Exiting program.')
+
+    return args
+
+
+def parse_args(argv=None):
+    """
+    This function parses the command line arguments of the scraper.
+
+    Returns:
+        argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(prog='tg-scraper', description='Scrape the posts of a Telegram channel into a compressed parquet file.')
+    parser.add_argument('channel', help="the XXXX part in 'https://web.telegram.org/k/#@XXXX'")
+    parser.add_argument('--start', default=f"{datetime.today().year}-01-01", help='the first date to scrape, YYYY-MM-DD (beginning of the current year by default)')
+    parser.add_argument('--finish', default=f"{datetime.today().year}-12-31", help='the last date to scrape, YYYY-MM-DD (end of the current year by default)')
+    parser.add_argument('--incremental', action='store_true', help='only scrape posts missing from previous runs, ignoring --finish')
+    contents = parser.add_mutually_exclusive_group()
+    contents.add_argument('--mask', action='store_true', help="substitute post contents with '#####'")
+    contents.add_argument('--hash-content', action='store_true', help=f"substitute post contents with their hashes, keyed with the {HASH_KEY_VARIABLE} environment variable if it is set")
+    parser.add_argument('--timezone', help="timezone of --start and --finish, e.g. 'Europe/Kyiv' (UTC by default)")
+    parser.add_argument('--content-stats', action='store_true', help='add the content_length, link_count and hashtag_count columns')
+    parser.add_argument('--transform', action='append', default=[], metavar='MODULE:FUNCTION', help='custom transform of the row groups, a function taking and returning a pyarrow.RecordBatch; can be repeated')
+    parser.add_argument('--rate', type=float, default=RATE, help='initial number of page requests per second')
+    parser.add_argument('--folder', default='data', help='output folder')
+    parser.add_argument('--cache', help='folder of the on-disk page cache')
+    parser.add_argument('--replay', action='store_true', help='only read pages from the cache, without network requests')
+    parser.add_argument('--fast', action='store_true', help='extract pages straight into Arrow columns with lxml')
+    parser.add_argument('--skip-seen', action='store_true', help='skip posts stored by previous runs and stop at a long run of them, for frequent polling')
+    parser.add_argument('--search-index', action='store_true', help="add the post contents to the full-text index in the output folder, searched with 'python -m tg_scraper.search'")
+    parser.add_argument('--dataset', action='store_true', help="add the posts to the 'channel=<name>/year=<Y>/month=<M>' dataset partitions in the output folder, skipping stored posts")
+    parser.add_argument('--compression', choices=COMPRESSIONS, default='gzip', help="compression codec of the output file ('gzip' by default)")
+    parser.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    parser.add_argument('--row-group-size', type=int, default=10_000, help='posts in a single row group of the output file (10000 by default)')
+    parser.add_argument('--metrics-file', help="file to export the stage metrics to while running (tg-metrics-<channel>.prom in the output folder by default)")
+    args = parser.parse_args(argv)
+
+    # Fail on malformed dates before any heavy import or request
+    for value in (args.start, args.finish):
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f"invalid date '{value}', expected YYYY-MM-DD")
+
+    if args.timezone and args.incremental:
+        parser.error('--timezone only applies to the --start and --finish range, not to --incremental')
+
+    if args.replay and not args.cache:
+        parser.error('--replay requires --cache')
+
+    if args.row_group_size < 1:
+        parser.error(f"invalid row group size {args.row_group_size}, expected at least 1 post")
+
+    return args
+
+
+def transforms_from_args(args):
+    """
+    This function builds the transforms of the output row groups from the command line
+    arguments: content statistics first, then content hashing and the custom transforms.
+
+    Returns:
+        list
+    """
+    if not (args.content_stats or args.hash_content or args.transform):
+        return []
+
+    from tg_scraper import transform
+
+    transforms = []
+    if args.content_stats:
+        transforms.append(transform.content_stats)
+    if args.hash_content:
+        transforms.append(transform.hash_content(os.environ.get(HASH_KEY_VARIABLE, '').encode('utf-8')))
+    transforms.extend(transform.load_transform(name) for name in args.transform)
+    return transforms
+
+
+def main(argv=None):
+    """
+    This function runs the scraper with the command line arguments, or asks
+    for the parameters interactively if it is started without any.
+
+    Returns:
+        str or None: The path of the output file.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv) if argv else prompt_args()
+
+    # Check if the output folder exists, else create one
+    os.makedirs(args.folder, exist_ok=True)
+
+    # Stop on SIGTERM like on Ctrl+C, so the writer merges the flushed row groups into the output file
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    cache = None
+    if args.cache:
+        from tg_scraper.cache import PageCache
+        cache = PageCache(args.cache, replay=args.replay)
+
+    writer_options = dict(compression=args.compression, compression_level=args.compression_level, batch_size=args.row_group_size, transforms=transforms_from_args(args))
+
+    if args.incremental:
+        return scrape_incremental(args.channel, args.start, not args.mask, args.rate, args.folder, cache, args.fast, args.metrics_file, writer_options, args.dataset, args.skip_seen, args.search_index)
+    return scrape_range(args.channel, args.start, args.finish, not args.mask, args.rate, args.folder, cache, args.fast, args.metrics_file, writer_options, args.dataset, args.timezone, args.skip_seen, args.search_index)
@@ -0,0 +1,309 @@
+from datetime import datetime, timedelta, timezone
+import argparse
+import heapq
+import os
+import signal
+import sys
+import time
+
+import pyarrow.compute as pc
+
+from tg_scraper.batch import read_jobs
+from tg_scraper.channel import ChannelScraper
+from tg_scraper.cli import chain, open_search_index, open_writer, run_name
+from tg_scraper.metrics import Metrics
+from tg_scraper.rate import RateController, RATE
+from tg_scraper.scrape import iter_batches
+from tg_scraper.seen import SeenIndex
+from tg_scraper.writer import BATCH_SIZE, COMPRESSION, SUFFIXES
+
+
+# Bounds of the interval between two polls of a channel
+MIN_INTERVAL = 30  # seconds
+MAX_INTERVAL = 3600  # seconds
+
+# Expected number of new posts per poll, a single head page holds about 20 posts
+POSTS_PER_POLL = 2
+
+# Weight of the latest poll in the posting rate of a channel
+RATE_WEIGHT = 0.3
+
+# Collected posts are written at least this often, as a micro-batch
+FLUSH_INTERVAL = 60  # seconds
+
+# Output files are closed and a new one is started this often, merging its micro-batch part files
+ROTATE_INTERVAL = 3600  # seconds
+
+
+class ChannelPoller:
+    """
+    This class polls the newest posts of a single channel and schedules its next poll
+    from the posting rate of the channel.
+
+    Every poll walks the channel from its newest post down to the newest stored one,
+    which usually takes a single head page, with a scraper kept open between polls.
+    A walk interrupted by a failed page leaves the posts below its last collected page
+    as a gap, which the next polls walk after the new posts.
+    The posting rate is an exponential moving average of the new posts per second
+    of every poll, and the next poll is due once POSTS_PER_POLL new posts are expected,
+    within MIN_INTERVAL and MAX_INTERVAL. An active channel is polled more often and
+    every poll without new posts backs off an idle one.
+
+    New posts are collected by the channel writer and written as a micro-batch at least
+    every FLUSH_INTERVAL seconds. Every micro-batch is a closed part file of its own,
+    readable right away and kept if the daemon is killed, see ParquetBatchWriter, and
+    its posts are marked as seen only once it is stored. In file mode, the output file
+    is closed every ROTATE_INTERVAL seconds, merging its part files, and a new
+    'tg-posts-<channel_name>-<run>' file is started, see 'run_name'.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel.
+
+    - start_date (str): The oldest date polled when nothing is stored for the channel yet,
+      in the format 'YYYY-MM-DD'.
+
+    - folder (str): The output folder. The default value is 'data'.
+
+    - verbose (bool): If False, post contents are substituted with '#####'.
+      The default value is True.
+
+    - rate_controller (RateController): The controller throttling the requests of all
+      channels. The default value is the controller shared by all scrapers of t.me.
+
+    - writer_options (dict): Keyword arguments of ParquetBatchWriter. The default value is None.
+
+    - dataset (bool): If True, posts are added to the channel partitions of a dataset
+      in the folder, see DatasetWriter. The default value is False.
+
+    - search (SearchIndex): If provided, the written posts are added to it.
+      The default value is None.
+
+    - on_timing (callable): If provided, it receives the stage timings, see Metrics.observe.
+      The default value is None.
+    """
+
+    def __init__(self, channel_name, start_date, folder='data', verbose=True, rate_controller=None, writer_options=None, dataset=False, search=None, on_timing=None):
+        self.channel_name = channel_name
+        self.start_date = start_date
+        self.folder = folder
+        self.verbose = verbose
+        self.writer_options = writer_options
+        self.dataset = dataset
+        self.search = search
+        self.on_timing = on_timing
+        self.scraper = ChannelScraper(channel_name, rate_controller=rate_controller, on_timing=on_timing)
+        self.seen = SeenIndex.load(channel_name, folder)
+        self.last_post_id = self.seen.ranges[-1][1] if self.seen.ranges else None
+        self.gaps = []
+        self.rate = None
+        self.interval = MIN_INTERVAL
+        self.last_poll = None
+        self.writer = None
+        self._opened = None
+        self._flushed = time.monotonic()
+
+
+    def poll(self):
+        """
+        This function collects the posts published since the newest stored one
+        and updates the posting rate and the poll interval of the channel.
+
+        Returns:
+            int: The number of new posts.
+        """
+        now = time.monotonic()
+        finish_date = (datetime.now(timezone.utc) + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        # Walks of the new posts and of the gaps left by failed polls, as (before, stop_at) ids
+        walks = [(None, self.last_post_id)] + self.gaps
+        new_posts = 0
+        dates = []
+        try:
+            while walks:
+                before, stop_at = walks[0]
+                for batch in iter_batches(self.channel_name, self.start_date, finish_date, self.verbose, before=before, stop_at=stop_at, channel=self.scraper):
+                    self._open_writer().write_batch(batch)
+                    new_posts += batch.num_rows
+                    dates.extend(batch.column('date').to_pylist())
+
+                    # Collected posts may not be written yet, the next poll stops at them anyway,
+                    # and only the posts below them are left of the walk
+                    post_ids = batch.column('post_id')
+                    if before is None:
+                        self.last_post_id = max(self.last_post_id or 0, pc.max(post_ids).as_py())
+                    walks[0] = (pc.min(post_ids).as_py(), stop_at)
+                walks.pop(0)
+        except Exception:
+            # The rest of the interrupted walk is a gap, a walk of new posts is started by every poll anyway
+            self.gaps = [walk for walk in walks if walk[0] is not None]
+
+            # A failing channel is polled less often, without stopping the others
+            self.interval = min(self.interval * 2, MAX_INTERVAL)
+            raise
+        self.gaps = []
+
+        if self.last_poll is None:
+            # The first poll has no previous one, so the rate is estimated from the dates of the new posts
+            span = (max(dates) - min(dates)).total_seconds() if len(dates) > 1 else 0
+            self.rate = (len(dates) - 1) / span if span > 0 else None
+        elif self.rate is None:
+            self.rate = new_posts / (now - self.last_poll)
+        else:
+            rate = new_posts / (now - self.last_poll)
+            self.rate = RATE_WEIGHT * rate + (1 - RATE_WEIGHT) * self.rate
+        self.last_poll = now
+
+        if self.rate is None:
+            self.interval = MIN_INTERVAL
+        else:
+            self.interval = min(max(POSTS_PER_POLL / self.rate, MIN_INTERVAL), MAX_INTERVAL) if self.rate > 0 else MAX_INTERVAL
+
+        self.maintain()
+        return new_posts
+
+
+    def maintain(self):
+        """
+        This function writes the collected posts once FLUSH_INTERVAL seconds passed
+        since the last micro-batch, and rotates the output file every ROTATE_INTERVAL.
+
+        Returns:
+            None
+        """
+        if self.writer is None:
+            return
+
+        now = time.monotonic()
+        if not self.dataset and now - self._opened >= ROTATE_INTERVAL:
+            self.close()
+        elif now - self._flushed >= FLUSH_INTERVAL:
+            self.writer.flush()
+            self._flushed = now
+
+
+    def _open_writer(self):
+        if self.writer is None:
+            # Posts are marked as seen after their micro-batch is stored in a closed part file
+            on_flush = chain(self.seen.record_batch, *([self.search.recorder(self.channel_name)] if self.search is not None else []))
+            self.writer, _ = open_writer(self.channel_name, run_name(), self.folder, self.dataset, self.writer_options, on_flush=on_flush, on_timing=self.on_timing)
+            self._opened = self._flushed = time.monotonic()
+        return self.writer
+
+
+    def close(self):
+        """
+        This function writes the collected posts and closes the output file.
+
+        Returns:
+            None
+        """
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.close()
+            self._flushed = time.monotonic()
+
+
+def run_daemon(channels, start_date=None, folder='data', rate=RATE, verbose=True, writer_options=None, dataset=False, search_index=False, metrics=None):
+    """
+    This function polls the channels until it is stopped (Ctrl+C or SIGTERM),
+    every channel on its own schedule, see ChannelPoller. All channels share
+    a single adaptive rate controller. The collected posts are written when
+    the daemon stops.
+
+    Parameters:
+    - channels (list): The names of the Telegram channels.
+
+    - start_date (str): The oldest date polled for channels without stored posts,
+      in the format 'YYYY-MM-DD'. The default value is today.
+
+    - folder, verbose, writer_options, dataset: See ChannelPoller.
+
+    - rate (float): The initial number of requests per second of all channels together.
+      The default value is RATE.
+
+    - search_index (bool): If True, the written posts are added to the full-text index
+      of the folder, see SearchIndex. The default value is False.
+
+    - metrics (Metrics): If provided, it collects the latencies of the scraping stages.
+      The default value is None.
+
+    Returns:
+        None
+    """
+    os.makedirs(folder, exist_ok=True)
+
+    start_date = start_date or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    rate_controller = RateController(rate=rate)
+    search = open_search_index(folder, search_index)
+    on_timing = metrics.observe if metrics is not None else None
+    pollers = [ChannelPoller(channel_name, start_date, folder, verbose, rate_controller, writer_options, dataset, search, on_timing) for channel_name in channels]
+
+    # Polls due next come first, ties are broken by the channel position
+    schedule = [(time.monotonic(), k) for k in range(len(pollers))]
+    heapq.heapify(schedule)
+
+    try:
+        while True:
+            due, k = heapq.heappop(schedule)
+            time.sleep(max(0, due - time.monotonic()))
+            poller = pollers[k]
+
+            try:
+                new_posts = poller.poll()
+                if new_posts:
+                    print(f"🔹 {datetime.now():%H:%M:%S} '{poller.channel_name}': {new_posts} new posts, next poll in {poller.interval:.0f} s")
+            except Exception as e:
+                print(f"🔴 {datetime.now():%H:%M:%S} '{poller.channel_name}': failed to poll ({e!r}), next poll in {poller.interval:.0f} s")
+
+            heapq.heappush(schedule, (time.monotonic() + poller.interval, k))
+
+            # Write the micro-batches of the channels waiting for their next poll
+            for other in pollers:
+                other.maintain()
+    finally:
+        for poller in pollers:
+            poller.close()
+        if search is not None:
+            search.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Continuously poll Telegram channels for new posts, each as often as it posts.')
+    parser.add_argument('channels', nargs='*', help="the XXXX parts of 'https://web.telegram.org/k/#@XXXX'")
+    parser.add_argument('--jobs', help='a file with one "channel_name" line per channel, dates are ignored')
+    parser.add_argument('--start', help='the oldest date to poll for channels without stored posts, YYYY-MM-DD (today by default)')
+    parser.add_argument('--folder', default='data', help="output folder ('data' by default)")
+    parser.add_argument('--rate', type=float, default=RATE, help=f'initial requests per second of all channels together, adjusted to the server responses ({RATE} by default)')
+    parser.add_argument('--mask', action='store_true', help="substitute post contents with '#####'")
+    parser.add_argument('--dataset', action='store_true', help="add the posts to the 'channel=<name>/year=<Y>/month=<M>' dataset partitions in the output folder")
+    parser.add_argument('--search-index', action='store_true', help='add the post contents to the full-text index in the output folder')
+    parser.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the output files ('{COMPRESSION}' by default)")
+    parser.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    parser.add_argument('--row-group-size', type=int, default=BATCH_SIZE, help=f'posts in a single row group of the output files ({BATCH_SIZE} by default)')
+    parser.add_argument('--metrics-port', type=int, help='local port to serve the stage metrics on, at /metrics and /metrics.json')
+    args = parser.parse_args()
+
+    channels = args.channels + ([job[0] for job in read_jobs(args.jobs)] if args.jobs else [])
+    if not channels:
+        parser.error('no channels to poll')
+
+    if args.row_group_size < 1:
+        parser.error(f"invalid row group size {args.row_group_size}, expected at least 1 post")
+
+    # Stop on SIGTERM like on Ctrl+C, so the collected posts are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    metrics = Metrics()
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    writer_options = dict(compression=args.compression, compression_level=args.compression_level, batch_size=args.row_group_size)
+
+    print(f"\n🧲 Polling {len(channels)} channels, press Ctrl+C to stop...\n")
+    try:
+        run_daemon(channels, args.start, args.folder, args.rate, not args.mask, writer_options, args.dataset, args.search_index, metrics)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    print(f"\n🔽 Posts saved in '{args.folder}' folder")
@@ -0,0 +1,281 @@
+from datetime import datetime
+from functools import reduce
+import argparse
+import glob
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from tg_scraper.writer import ParquetBatchWriter, BATCH_SIZE, COMPRESSION, SCHEMA, SUFFIXES, file_suffix, write_options
+
+
+# Partitions of a channel folder, 'year=<Y>/month=<M>' by the UTC date of the posts
+PARTITIONING = ds.partitioning(pa.schema([('year', pa.int16()), ('month', pa.int8())]), flavor='hive')
+
+# Partitions of the whole dataset, 'channel=<name>/year=<Y>/month=<M>'
+DATASET_PARTITIONING = ds.partitioning(pa.schema([('channel', pa.string()), ('year', pa.int16()), ('month', pa.int8())]), flavor='hive')
+
+# Maximum number of posts in a single file written by compaction
+MAX_ROWS = 1_000_000
+
+
+def channel_folder(root, channel_name):
+    """
+    This function returns the folder of a channel in a dataset.
+
+    Returns:
+        str
+    """
+    return os.path.join(root, f"channel={channel_name}")
+
+
+def channel_files(folder, channel_name):
+    """
+    This function lists the stored posts files of a channel in a folder: its
+    'tg-posts-<channel_name>-*' output files and the files of its dataset partitions.
+
+    Returns:
+        list of str
+    """
+    paths = glob.glob(os.path.join(folder, f"tg-posts-{channel_name}-*.parquet*"))
+    paths = [path for path in paths if path.endswith(tuple(SUFFIXES.values()))]
+    paths += [path for partition in _partition_folders(folder, channel_name) for path in _data_files(partition)]
+    return sorted(paths)
+
+
+def open_dataset(root='data', schema=None):
+    """
+    This function opens all channels of a dataset written by DatasetWriter as one
+    pyarrow dataset with 'channel', 'year' and 'month' partition columns, so filters
+    on them skip whole folders and filters on the other columns use the file statistics.
+
+    Parameters:
+    - root (str): The dataset folder. The default value is 'data'.
+
+    - schema (pyarrow.Schema): The schema of the files, without the partition columns.
+      The default value is the schema of the first file, or SCHEMA if there are none.
+
+    Returns:
+        pyarrow.dataset.Dataset
+    """
+    paths = [path for folder in _partition_folders(root) for path in _data_files(folder)]
+    if schema is None and not paths:
+        schema = SCHEMA
+
+    return ds.dataset(
+        paths,
+        schema=pa.unify_schemas([schema, DATASET_PARTITIONING.schema]) if schema is not None else None,
+        format='parquet',
+        partitioning=DATASET_PARTITIONING,
+        partition_base_dir=root,
+        )
+
+
+def unique_posts(table):
+    """
+    This function removes the posts with repeated ids from a table, keeping the first one.
+
+    Returns:
+        pyarrow.Table
+    """
+    if table.num_rows < 2:
+        return table
+
+    first = (table.select(['post_id'])
+        .append_column('row', pa.array(range(table.num_rows), pa.int64()))
+        .group_by('post_id', use_threads=False)
+        .aggregate([('row', 'min')])
+        .column('row_min'))
+
+    if len(first) == table.num_rows:
+        return table
+    # Take the first rows in their original order, not the positions of the groups
+    return table.take(first.take(pc.sort_indices(first)))
+
+
+class DatasetWriter(ParquetBatchWriter):
+    """
+    This class streams scraped posts of a channel into a hive-partitioned dataset,
+    'channel=<name>/year=<Y>/month=<M>/' in the root folder, instead of a single file.
+
+    Every flushed batch is written as new files of the partitions of its posts,
+    without the posts already stored in them, so overlapping runs never store
+    a post twice. The ids stored in a partition are read when the first post of
+    the partition is written, and the files added by other writers since then
+    are read before every following write. Writers of the same channel running
+    at the same time can still both store a post written by both of them between
+    these checks; 'compact', which merges the small files written by many runs,
+    removes such duplicates.
+
+    Parameters:
+    - root (str): The dataset folder.
+
+    - channel_name (str): The name of the scraped Telegram channel.
+
+    The rest of the parameters are the same as in ParquetBatchWriter.
+    """
+
+    def __init__(self, root, channel_name, batch_size=BATCH_SIZE, schema=SCHEMA, on_flush=None, on_timing=None, compression=COMPRESSION, compression_level=None, transforms=None):
+        self.root = root
+        self.channel_name = channel_name
+        self._known = {}
+        self._read = {}
+        self._files = 0
+        self._token = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        super().__init__(channel_folder(root, channel_name), batch_size, schema, on_flush, on_timing, compression, compression_level, transforms)
+
+
+    def _open(self):
+        os.makedirs(self.path, exist_ok=True)
+        return ds.ParquetFileFormat().make_write_options(**write_options(self.file_schema, self.compression, self.compression_level))
+
+
+    def _known_ids(self, year, month):
+        # Ids of the posts stored in a partition, by other runs or by this writer
+        key = (year, month)
+        known = self._known.get(key, pa.chunked_array([], pa.int64()))
+        read = self._read.setdefault(key, set())
+
+        # Read the files added by other writers since the last write, the ids of this writer's files are already known
+        folder = os.path.join(self.path, f"year={year}", f"month={month}")
+        new_paths = [path for path in _data_files(folder) if path not in read and not os.path.basename(path).startswith(f"part-{self._token}-")] if os.path.isdir(folder) else []
+        if new_paths:
+            post_ids = ds.dataset(new_paths, schema=self.file_schema, format='parquet').to_table(columns=['post_id']).column('post_id')
+            known = pa.chunked_array(known.chunks + post_ids.chunks, pa.int64())
+            read.update(new_paths)
+
+        self._known[key] = known
+        return known
+
+
+    def _write_table(self, table):
+        table = unique_posts(table)
+        years = pc.year(table.column('date')).cast(pa.int16())
+        months = pc.month(table.column('date')).cast(pa.int8())
+        table = table.append_column('year', years).append_column('month', months)
+
+        # Skip the posts already stored in their partitions
+        keep = []
+        for year, month in set(zip(years.to_pylist(), months.to_pylist())):
+            in_partition = pc.and_(pc.equal(years, year), pc.equal(months, month))
+            known = self._known_ids(year, month)
+            stored = pc.is_in(table.column('post_id'), value_set=known.combine_chunks()) if len(known) else pa.repeat(False, table.num_rows)
+            keep.append(pc.and_(in_partition, pc.invert(stored)))
+
+            new_ids = table.column('post_id').filter(keep[-1])
+            self._known[(year, month)] = pa.chunked_array(known.chunks + new_ids.chunks, pa.int64())
+
+        table = table.filter(reduce(pc.or_, keep))
+        if table.num_rows == 0:
+            return 0
+
+        ds.write_dataset(
+            table,
+            self.path,
+            format='parquet',
+            partitioning=PARTITIONING,
+            basename_template=f"part-{self._token}-{self._files}-{{i}}{file_suffix(self.compression)}",
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=self._writer,
+            max_rows_per_group=self.batch_size,
+            )
+        self._files += 1
+
+        return table.num_rows
+
+
+    def _close(self):
+        pass
+
+
+def _partition_folders(root, channel_name=None):
+    # Leaf 'month=<M>' folders of one or all channels
+    channel = f"channel={channel_name}" if channel_name else 'channel=*'
+    return sorted(glob.glob(os.path.join(root, channel, 'year=*', 'month=*')))
+
+
+def _data_files(folder):
+    # Hidden and '_'-prefixed files are ignored by dataset readers, like unfinished compactions
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if not name.startswith(('.', '_')) and name.endswith(tuple(SUFFIXES.values()))
+        )
+
+
+def compact(root='data', channel_name=None, max_rows=MAX_ROWS, batch_size=BATCH_SIZE, compression=COMPRESSION, compression_level=None):
+    """
+    This function merges the files of every partition of a dataset into as few
+    files of up to 'max_rows' posts as possible, sorted by post_id and without
+    repeated posts. New files are written under a hidden name and renamed when
+    complete, and the old ones are removed afterwards, so an interrupted compaction
+    never loses posts and readers never see a half-written file.
+
+    Parameters:
+    - root (str): The dataset folder. The default value is 'data'.
+
+    - channel_name (str): If provided, only this channel is compacted.
+      The default value is None.
+
+    - max_rows (int): The maximum number of posts in a single file.
+      The default value is MAX_ROWS.
+
+    - batch_size (int): The number of posts in a row group. The default value is BATCH_SIZE.
+
+    - compression (str): The compression codec. The default value is 'gzip'.
+
+    - compression_level (int): The codec compression level. The default value is the codec default.
+
+    Returns:
+        tuple: The number of compacted partitions, files before and files after compaction.
+    """
+    partitions, files_before, files_after = 0, 0, 0
+    token = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+    for folder in _partition_folders(root, channel_name):
+        paths = _data_files(folder)
+        if len(paths) < 2:
+            continue
+
+        # Files written with different transforms may have different columns
+        schema = pa.unify_schemas([pq.read_schema(path) for path in paths])
+        table = ds.dataset(paths, schema=schema, format='parquet').to_table()
+        table = unique_posts(table.take(pc.sort_indices(table.column('post_id'))))
+
+        new_paths = []
+        for k, offset in enumerate(range(0, table.num_rows, max_rows)):
+            name = f"part-compacted-{token}-{k}{file_suffix(compression)}"
+            temporary = os.path.join(folder, f"_{name}")
+            with ParquetBatchWriter(temporary, batch_size, schema, compression=compression, compression_level=compression_level) as writer:
+                writer.write_batch(table.slice(offset, max_rows))
+            os.replace(temporary, os.path.join(folder, name))
+            new_paths.append(name)
+
+        for path in paths:
+            os.remove(path)
+
+        partitions += 1
+        files_before += len(paths)
+        files_after += len(new_paths)
+
+    return partitions, files_before, files_after
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compact the partitions of a posts dataset into larger files sorted by post_id.')
+    parser.add_argument('root', nargs='?', default='data', help="dataset folder ('data' by default)")
+    parser.add_argument('--channel', help='only compact this channel')
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS, help=f'posts in a single file ({MAX_ROWS} by default)')
+    parser.add_argument('--row-group-size', type=int, default=BATCH_SIZE, help=f'posts in a single row group ({BATCH_SIZE} by default)')
+    parser.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the compacted files ('{COMPRESSION}' by default)")
+    parser.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    args = parser.parse_args()
+
+    print(f"\n🧲 Compacting the dataset in '{args.root}'...\n")
+
+    partitions, files_before, files_after = compact(args.root, args.channel, args.max_rows, args.row_group_size, args.compression, args.compression_level)
+
+    print(f"✔️ Compacted {partitions} partitions from {files_before} into {files_after} files.")
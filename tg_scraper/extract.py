@@ -0,0 +1,65 @@
+import lxml.etree
+import lxml.html
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from tg_scraper.writer import SCHEMA
+
+
+def _has_class(name):
+    # Class names are matched as whole words, like BeautifulSoup does
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# XPath expressions of the t.me post markup, compiled once
+_MESSAGES = lxml.etree.XPath(f"//div[{_has_class('tgme_widget_message')} and @data-post]")
+_DATE_LINK = lxml.etree.XPath(f".//div[{_has_class('tgme_widget_message_footer')}]//a[{_has_class('tgme_widget_message_date')}]")
+_TEXT = lxml.etree.XPath(f"(.//div[{_has_class('tgme_widget_message_text')}])[1]")
+
+
+def extract_page(text, verbose=True, schema=SCHEMA):
+    """
+    This function extracts the posts of a t.me channel page straight into Arrow columns,
+    without BeautifulSoup and TelegramPost objects. The values match the ones
+    built from TelegramPost: 'post_url' is the '/s/' url of the post, 'content'
+    is the text of the first message text block, or None if there is none.
+
+    Parameters:
+    - text (str): The page HTML.
+
+    - verbose (bool): If False, post contents are substituted with '#####'.
+      The default value is True.
+
+    - schema (pyarrow.Schema): The output schema. The default value is SCHEMA.
+
+    Returns:
+        pyarrow.RecordBatch with the posts of the page, newest first.
+    """
+    post_ids, post_urls, dates, contents = [], [], [], []
+
+    # Posts on a page go from older to newer
+    for message in reversed(_MESSAGES(lxml.html.fromstring(text))):
+        date_link = _DATE_LINK(message)[0]
+        raw_url = date_link.get('href')
+
+        post_ids.append(int(raw_url.rsplit('/', 1)[1]))
+        post_urls.append(raw_url.replace('//t.me/', '//t.me/s/'))
+        dates.append(date_link.find('.//time').get('datetime'))
+
+        if verbose:
+            text_div = _TEXT(message)
+            contents.append(text_div[0].text_content() if text_div else None)
+
+    if not verbose:
+        contents = ['#####'] * len(post_ids)
+
+    # Dates are ISO strings with a UTC offset, parsed for the whole page at once
+    timestamps = pc.strptime(pa.array(dates, pa.string()), format='%Y-%m-%dT%H:%M:%S%z', unit='us')
+
+    columns = {
+        'post_id': pa.array(post_ids, pa.int64()),
+        'post_url': pa.array(post_urls, pa.string()),
+        'date': timestamps.cast(schema.field('date').type),
+        'content': pa.array(contents, pa.string()),
+        }
+    return pa.RecordBatch.from_pydict({name: columns[name].cast(schema.field(name).type) for name in schema.names}, schema=schema)
@@ -0,0 +1,479 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from tg_scraper.batch import job_name, read_jobs, scrape_job
+from tg_scraper.cache import PageCache
+from tg_scraper.cli import output_file_name
+from tg_scraper.rate import RateController, RATE
+from tg_scraper.writer import BATCH_SIZE, COMPRESSION, SUFFIXES
+
+
+# File name of the job queue in the output folder
+QUEUE_NAME = 'tg-jobs.sqlite'
+
+# Number of worker processes on a host
+WORKERS = os.cpu_count() or 4
+
+# A claimed job returns to the queue if its worker does not renew the lease in time
+LEASE = 300  # seconds
+
+# Number of times a job is tried before it is marked as failed
+MAX_ATTEMPTS = 3
+
+# Delay before a failed job is tried again, doubled with every attempt
+RETRY_DELAY = 60  # seconds
+
+# Interval at which idle workers check for jobs released by other workers
+POLL_INTERVAL = 5  # seconds
+
+# Delay before a lease renewal that failed on a busy or unavailable queue is tried again
+HEARTBEAT_RETRY = 5  # seconds
+
+TABLES = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    finish_date TEXT NOT NULL,
+    low INTEGER,
+    high INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    posts INTEGER,
+    error TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_key ON jobs (channel, start_date, finish_date, coalesce(low, -1), coalesce(high, -1));
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+"""
+
+
+class JobQueue:
+    """
+    This class is a durable queue of scraping jobs in an SQLite file, shared by
+    worker processes on one host, or on several hosts through a shared folder
+    with working file locks if 'shared' is True.
+
+    A job is a channel and a date range, optionally limited to a shard of post ids.
+    Workers claim jobs with a lease of 'lease' seconds and renew it while they work.
+    A job whose lease runs out, e.g. because its worker crashed, is claimed by
+    another worker. Failed jobs are tried again after a growing delay, up to
+    MAX_ATTEMPTS times. Every change is a single transaction, so the queue
+    survives the crash of any worker.
+
+    Parameters:
+    - path (str): The queue file. The default value is QUEUE_NAME in the 'data' folder.
+
+    - lease (float): The lease duration in seconds. The default value is LEASE.
+
+    - max_attempts (int): The number of times a job is tried. The default value is MAX_ATTEMPTS.
+
+    - shared (bool): If True, the queue is kept in rollback journal mode, which works
+      on network file systems, instead of the faster write-ahead log, which only works
+      for processes of one host. All users of a queue file must agree on it.
+      The default value is False.
+    """
+
+    def __init__(self, path=os.path.join('data', QUEUE_NAME), lease=LEASE, max_attempts=MAX_ATTEMPTS, shared=False):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+        # Transactions are started explicitly, concurrent workers wait for each other's locks
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=DELETE' if shared else 'PRAGMA journal_mode=WAL')
+        self._connection.executescript(TABLES)
+
+
+    def add(self, jobs):
+        """
+        This function adds jobs to the queue. Jobs already in the queue are skipped,
+        so a jobs file can be added again after it was extended.
+
+        Parameters:
+        - jobs (list): (channel_name, start_date, finish_date) tuples, or
+          (channel_name, start_date, finish_date, low, high) tuples of post id shards.
+
+        Returns:
+            int: The number of added jobs.
+        """
+        rows = [tuple(job) + (None, None) if len(job) == 3 else tuple(job) for job in jobs]
+
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._connection.total_changes
+            self._connection.executemany('INSERT OR IGNORE INTO jobs (channel, start_date, finish_date, low, high) VALUES (?, ?, ?, ?, ?)', rows)
+            added = self._connection.total_changes - before
+            self._connection.execute('COMMIT')
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+        return added
+
+
+    def claim(self, worker):
+        """
+        This function leases the next available job to a worker: a pending job,
+        or a job whose lease has run out.
+
+        Returns:
+            dict or None: The job, or None if no job is available right now.
+        """
+        now = time.time()
+
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Jobs of crashed workers that used up their attempts are not tried again
+            self._connection.execute("""
+                UPDATE jobs SET state = 'failed', error = coalesce(error, 'lease expired')
+                WHERE state = 'leased' AND lease_until < ? AND attempts >= ?
+                """, (now, self.max_attempts))
+
+            row = self._connection.execute("""
+                SELECT id FROM jobs
+                WHERE (state = 'pending' AND available_at <= ?) OR (state = 'leased' AND lease_until < ?)
+                ORDER BY id LIMIT 1
+                """, (now, now)).fetchone()
+
+            if row is not None:
+                self._connection.execute("""
+                    UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1
+                    WHERE id = ?
+                    """, (worker, now + self.lease, row[0]))
+            self._connection.execute('COMMIT')
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+
+        return self._job(row[0]) if row is not None else None
+
+
+    def heartbeat(self, job_id, worker):
+        """
+        This function renews the lease of a job held by a worker.
+
+        Returns:
+            bool: False if the worker does not hold the lease anymore.
+        """
+        cursor = self._connection.execute("""
+            UPDATE jobs SET lease_until = ?
+            WHERE id = ? AND worker = ? AND state = 'leased'
+            """, (time.time() + self.lease, job_id, worker))
+        return cursor.rowcount == 1
+
+
+    def complete(self, job_id, worker, posts):
+        """
+        This function marks a job held by a worker as done.
+
+        Returns:
+            bool: False if the worker does not hold the lease anymore.
+        """
+        cursor = self._connection.execute("""
+            UPDATE jobs SET state = 'done', posts = ?, error = NULL, lease_until = NULL
+            WHERE id = ? AND worker = ? AND state = 'leased'
+            """, (posts, job_id, worker))
+        return cursor.rowcount == 1
+
+
+    def fail(self, job_id, worker, error):
+        """
+        This function returns a failed job to the queue, to be tried again after
+        RETRY_DELAY seconds doubled with every attempt, or marks it as failed
+        once it was tried 'max_attempts' times.
+
+        Returns:
+            bool: False if the worker does not hold the lease anymore.
+        """
+        cursor = self._connection.execute("""
+            UPDATE jobs SET
+                state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                available_at = ? * (1 << (attempts - 1)) + ?,
+                error = ?, lease_until = NULL
+            WHERE id = ? AND worker = ? AND state = 'leased'
+            """, (self.max_attempts, RETRY_DELAY, time.time(), error, job_id, worker))
+        return cursor.rowcount == 1
+
+
+    def counts(self):
+        """
+        This function counts the jobs in every state: 'pending', 'leased', 'done' and 'failed'.
+
+        Returns:
+            dict
+        """
+        counts = dict.fromkeys(['pending', 'leased', 'done', 'failed'], 0)
+        counts.update(self._connection.execute('SELECT state, count(*) FROM jobs GROUP BY state').fetchall())
+        return counts
+
+
+    def failed(self):
+        """
+        This function lists the jobs that failed on every attempt.
+
+        Returns:
+            list of dict
+        """
+        rows = self._connection.execute("SELECT id FROM jobs WHERE state = 'failed' ORDER BY id").fetchall()
+        return [self._job(job_id) for job_id, in rows]
+
+
+    def retry_failed(self):
+        """
+        This function returns the failed jobs to the queue with new attempts.
+
+        Returns:
+            int: The number of returned jobs.
+        """
+        cursor = self._connection.execute("UPDATE jobs SET state = 'pending', attempts = 0, available_at = 0 WHERE state = 'failed'")
+        return cursor.rowcount
+
+
+    def _job(self, job_id):
+        cursor = self._connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        names = [column[0] for column in cursor.description]
+        return dict(zip(names, cursor.fetchone()))
+
+
+    def close(self):
+        self._connection.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def shard_jobs(jobs, shards, cache=None):
+    """
+    This function splits every (channel_name, start_date, finish_date) job into
+    'shards' jobs of disjoint post id ranges, see 'find_id_range'. Jobs without
+    posts in their date range are dropped.
+
+    Returns:
+        list of (channel_name, start_date, finish_date, low, high) tuples
+    """
+    from tg_scraper.shard import find_id_range, split_range
+
+    sharded = []
+    for channel_name, start_date, finish_date in jobs:
+        id_range = find_id_range(channel_name, start_date, finish_date, cache)
+        if id_range is not None:
+            sharded.extend((channel_name, start_date, finish_date, low, high) for low, high in split_range(*id_range, shards))
+    return sharded
+
+
+def run_worker(queue_path, folder='data', rate=RATE, verbose=True, cache=None, fast=False, writer_options=None, dataset=False, lease=LEASE, worker=None, shared=False):
+    """
+    This function claims and scrapes jobs from the queue until none are left,
+    writing every job through 'scrape_job'. The lease of the current job is renewed
+    on a background thread, and scraping stops once the lease is lost. A worker that
+    finds no available job while other jobs are still leased waits for them, and takes
+    them over if their leases run out.
+
+    Every attempt is written to a temporary file, renamed to the output file only
+    once the job is completed, so an attempt that failed or lost its lease never
+    leaves a partial file behind. Dataset partitions are written directly, their
+    writer skips the posts stored by another attempt.
+
+    Parameters:
+    - queue_path (str): The queue file, see JobQueue.
+
+    - folder, verbose, cache, fast, writer_options, dataset: See 'scrape_job'.
+
+    - rate (float): The initial number of requests per second of the worker.
+      The default value is RATE.
+
+    - lease (float): The lease duration in seconds. The default value is LEASE.
+
+    - worker (str): The name of the worker in the queue.
+      The default value is '<host name>-<process id>'.
+
+    - shared (bool): See JobQueue. The default value is False.
+
+    Returns:
+        int: The number of jobs done by the worker.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    rate_controller = RateController(rate=rate)
+    done = 0
+
+    with JobQueue(queue_path, lease, shared=shared) as queue:
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                counts = queue.counts()
+                if counts['pending'] == 0 and counts['leased'] == 0:
+                    return done
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            name = f"'{job['channel']}' between {job['start_date']} and {job['finish_date']}"
+            if job['low'] is not None:
+                name += f", posts #{job['low']}-#{job['high']}"
+
+            id_range = (job['low'], job['high']) if job['low'] is not None else None
+            path = os.path.join(folder, output_file_name(job['channel'], job_name(job['start_date'], job['finish_date'], id_range), writer_options))
+            suffix = f".{worker}.tmp" if not dataset else ''
+
+            stop_heartbeat, lease_lost = _start_heartbeat(queue_path, job['id'], worker, lease, shared)
+            try:
+                posts = scrape_job(job['channel'], job['start_date'], job['finish_date'], folder, verbose, rate_controller=rate_controller, cache=cache, fast=fast,
+                                   writer_options=writer_options, dataset=dataset, id_range=id_range, suffix=suffix, stop=lease_lost)
+            except Exception as e:
+                # A failed job is tried again later, possibly by another worker
+                stop_heartbeat()
+                _remove(path + suffix, dataset)
+                queue.fail(job['id'], worker, repr(e))
+                print(f"🔴 [{worker}] Failed to scrape {name} (attempt {job['attempts']}): {e!r}")
+                continue
+
+            stop_heartbeat()
+            if not lease_lost.is_set() and queue.complete(job['id'], worker, posts):
+                if not dataset:
+                    os.replace(path + suffix, path)
+                done += 1
+                print(f"✔️ [{worker}] Scraped {posts} posts from {name}")
+            else:
+                _remove(path + suffix, dataset)
+                print(f"🔴 [{worker}] Lost the lease of {name}, it is scraped again by another worker")
+
+
+def _remove(path, dataset):
+    # Drop the temporary file of an attempt, dataset partitions have none
+    if not dataset and os.path.exists(path):
+        os.remove(path)
+
+
+def _start_heartbeat(queue_path, job_id, worker, lease, shared=False):
+    # Renew the lease three times per lease duration on a separate connection, until stopped.
+    # Returns the stop function and an event set once the lease is lost.
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def renew():
+        queue = None
+        renewed = time.monotonic()
+        delay = lease / 3
+        try:
+            while not stop.wait(delay):
+                try:
+                    queue = queue or JobQueue(queue_path, lease, shared=shared)
+                    held = queue.heartbeat(job_id, worker)
+                except sqlite3.Error:
+                    # A busy or unavailable queue is tried again soon, until the lease would have run out
+                    if time.monotonic() - renewed >= lease:
+                        lost.set()
+                        return
+                    delay = min(HEARTBEAT_RETRY, lease / 3)
+                    continue
+
+                if not held:
+                    lost.set()
+                    return
+                renewed = time.monotonic()
+                delay = lease / 3
+        finally:
+            if queue is not None:
+                queue.close()
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+
+    def stop_heartbeat():
+        stop.set()
+        thread.join()
+
+    return stop_heartbeat, lost
+
+
+def run_workers(queue_path, workers=WORKERS, folder='data', rate=RATE, verbose=True, cache=None, fast=False, writer_options=None, dataset=False, lease=LEASE, shared=False):
+    """
+    This function runs 'workers' worker processes on the queue until no jobs are left.
+    Separate processes, unlike threads, also parse the pages in parallel. Processes
+    cannot share a rate controller, so every worker starts with an equal part of 'rate'.
+    More hosts join the same backfill by running workers on the same queue file
+    in a shared folder, with 'shared' set to True on every host.
+
+    Parameters:
+    - queue_path (str): The queue file, see JobQueue.
+
+    - workers (int): The number of worker processes. The default value is WORKERS.
+
+    The rest of the parameters are the same as in 'run_worker'.
+
+    Returns:
+        int: The number of jobs done by the workers.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_worker, queue_path, folder, rate / workers, verbose, cache, fast, writer_options, dataset, lease, shared=shared)
+            for _ in range(workers)
+            ]
+        return sum(future.result() for future in futures)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape many Telegram channels from a durable job queue with worker processes on one or more hosts.')
+    parser.add_argument('--queue', help=f"the queue file ('{QUEUE_NAME}' in the output folder by default)")
+    parser.add_argument('--folder', default='data', help="output folder ('data' by default)")
+    parser.add_argument('--shared', action='store_true', help='the queue file is in a folder shared by several hosts, use it on every host')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='add the jobs of a jobs file to the queue')
+    add.add_argument('jobs', help='a file with one "channel_name[,start_date[,finish_date]]" line per channel')
+    add.add_argument('--shards', type=int, default=1, help='split every channel into this many jobs of post id ranges (1 by default)')
+
+    work = commands.add_parser('work', help='run worker processes until the queue is empty')
+    work.add_argument('--workers', type=int, default=WORKERS, help=f'worker processes on this host ({WORKERS} by default)')
+    work.add_argument('--rate', type=float, default=RATE, help=f'initial requests per second of all workers of this host together ({RATE} by default)')
+    work.add_argument('--lease', type=float, default=LEASE, help=f'seconds a job stays claimed without a heartbeat ({LEASE} by default)')
+    work.add_argument('--mask', action='store_true', help="substitute post contents with '#####'")
+    work.add_argument('--cache', help='folder to cache fetched pages in')
+    work.add_argument('--fast', action='store_true', help='extract pages straight into Arrow columns with lxml')
+    work.add_argument('--dataset', action='store_true', help="add the posts to the 'channel=<name>/year=<Y>/month=<M>' dataset partitions in the output folder, skipping stored posts")
+    work.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the output files ('{COMPRESSION}' by default)")
+    work.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    work.add_argument('--row-group-size', type=int, default=BATCH_SIZE, help=f'posts in a single row group of the output files ({BATCH_SIZE} by default)')
+
+    status = commands.add_parser('status', help='count the jobs in every state and list the failed ones')
+    status.add_argument('--retry', action='store_true', help='return the failed jobs to the queue')
+    args = parser.parse_args()
+
+    os.makedirs(args.folder, exist_ok=True)
+    queue_path = args.queue or os.path.join(args.folder, QUEUE_NAME)
+
+    if args.command == 'add':
+        jobs = read_jobs(args.jobs)
+        if args.shards > 1:
+            print(f"\n🧲 Finding the post ids of {len(jobs)} channels...\n")
+            jobs = shard_jobs(jobs, args.shards)
+        with JobQueue(queue_path, shared=args.shared) as queue:
+            added = queue.add(jobs)
+        print(f"✔️ Added {added} of {len(jobs)} jobs to '{queue_path}'")
+
+    elif args.command == 'work':
+        cache = PageCache(args.cache) if args.cache else None
+        writer_options = dict(compression=args.compression, compression_level=args.compression_level, batch_size=args.row_group_size)
+        print(f"\n🧲 Running {args.workers} workers on '{queue_path}'...\n")
+
+        done = run_workers(queue_path, args.workers, args.folder, args.rate, not args.mask, cache, args.fast, writer_options, args.dataset, args.lease, args.shared)
+        print(f"\n🔽 {done} jobs done, posts saved in '{args.folder}' folder")
+
+    else:
+        with JobQueue(queue_path, shared=args.shared) as queue:
+            if args.retry:
+                print(f"🔸 Returned {queue.retry_failed()} failed jobs to the queue")
+            print(' '.join(f"🔹 {state}: {count}" for state, count in queue.counts().items()))
+            for job in queue.failed():
+                print(f"🔴 '{job['channel']}' between {job['start_date']} and {job['finish_date']}: {job['error']}")
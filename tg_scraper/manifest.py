@@ -0,0 +1,238 @@
+import glob
+import json
+import os
+
+from pyarrow.parquet import read_table
+
+from tg_scraper.writer import SUFFIXES
+
+
+class Manifest:
+    """
+    This class keeps a per-channel checkpoint of the posts stored by previous runs.
+
+    The manifest is a small JSON file next to the output files. It holds the ranges
+    of post ids walked by previous runs, the date coverage of the stored posts and
+    the output files they were written to. Scraping walks a channel from newer to
+    older posts, so a range grows downwards with every flushed batch, and a run
+    interrupted in the middle leaves a gap that the next run fills first. The
+    manifest also keeps the start date the walk below the oldest stored post has
+    reached, so a run interrupted before it continues below that post.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel.
+
+    - folder (str): The folder with the output files and the manifest.
+      The default value is 'data'.
+    """
+
+    def __init__(self, channel_name, folder='data'):
+        self.channel_name = channel_name
+        self.folder = folder
+        self.ranges = []
+        self.first_date = None
+        self.last_date = None
+        self.files = []
+        self.floor_date = None
+        self._task_high = None
+
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, f"tg-manifest-{self.channel_name}.json")
+
+
+    @property
+    def max_post_id(self):
+        return self.ranges[-1][1] if self.ranges else None
+
+
+    @property
+    def min_post_id(self):
+        return self.ranges[0][0] if self.ranges else None
+
+
+    @classmethod
+    def load(cls, channel_name, folder='data'):
+        """
+        This function reads the channel manifest. If there is none yet, the manifest
+        is seeded from the channel output files already present in the folder.
+
+        Returns:
+            Manifest
+        """
+        manifest = cls(channel_name, folder)
+
+        if os.path.exists(manifest.path):
+            with open(manifest.path, encoding='utf-8') as f:
+                state = json.load(f)
+            manifest.ranges = [list(r) for r in state['ranges']]
+            manifest.first_date = state['first_date']
+            manifest.last_date = state['last_date']
+            manifest.files = state['files']
+            manifest.floor_date = state.get('floor_date')
+            return manifest
+
+        # Every existing file was written by a single walk, so its ids form one range
+        paths = glob.glob(os.path.join(folder, f"tg-posts-{channel_name}-*.parquet*"))
+        for path in sorted(path for path in paths if path.endswith(tuple(SUFFIXES.values()))):
+            table = read_table(path, columns=['post_id', 'date'])
+            if table.num_rows == 0:
+                continue
+            post_ids = [int(post_id) for post_id in table.column('post_id').to_pylist()]
+            dates = table.column('date').to_pylist()
+            manifest.cover(min(post_ids), max(post_ids))
+            manifest._cover_dates(min(dates).date().isoformat(), max(dates).date().isoformat())
+            manifest.files.append(os.path.basename(path))
+
+        return manifest
+
+
+    def save(self):
+        """
+        This function atomically writes the manifest to its JSON file.
+
+        Returns:
+            None
+        """
+        state = {
+            'channel': self.channel_name,
+            'max_post_id': self.max_post_id,
+            'min_post_id': self.min_post_id,
+            'ranges': self.ranges,
+            'first_date': self.first_date,
+            'last_date': self.last_date,
+            'files': self.files,
+            'floor_date': self.floor_date,
+        }
+
+        # Replace the manifest in one step, so an interruption never leaves a broken file
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+    def cover(self, low, high):
+        """
+        This function marks post ids from 'low' to 'high' (including both) as walked,
+        merging the range with the overlapping or adjacent ones.
+
+        Returns:
+            None
+        """
+        ranges = sorted(self.ranges + [[low, high]])
+        merged = [ranges[0]]
+        for r in ranges[1:]:
+            if r[0] <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], r[1])
+            else:
+                merged.append(r)
+        self.ranges = merged
+
+
+    def tasks(self, start_date=None):
+        """
+        This function lists the walks a run has to make, newest first. The first walk
+        fetches posts newer than the checkpoint, the next ones fill gaps left by interrupted
+        runs, and the last one continues below the oldest stored post until a walk reaches
+        'start_date' there.
+
+        Parameters:
+        - start_date (str): The date from which the run scrapes posts, in the format
+          'YYYY-MM-DD'. The default value is None, the beginning of the channel.
+
+        Returns:
+            list of (before, stop_at) tuples, where 'before' is the post id to start
+            below (None for the newest post) and 'stop_at' is the post id to stop at
+            (None for no limit).
+        """
+        tasks = [(None, self.max_post_id)]
+        for lower, upper in zip(self.ranges[-2::-1], self.ranges[::-1]):
+            tasks.append((upper[0], lower[1]))
+
+        # Posts below the oldest stored one are missing until a walk reached the start date there
+        if self.min_post_id is not None and self.min_post_id > 1:
+            if self.floor_date is None or (start_date or '') < self.floor_date:
+                tasks.append((self.min_post_id, None))
+        return tasks
+
+
+    def begin(self, before):
+        """
+        This function starts tracking a walk that begins below the 'before' post id.
+
+        Returns:
+            None
+        """
+        self._task_high = before - 1 if before is not None else None
+
+
+    def record_batch(self, batch):
+        """
+        This function marks the posts of a flushed batch as stored and saves the manifest.
+        It can be passed to ParquetBatchWriter as 'on_flush'.
+
+        Returns:
+            None
+        """
+        if batch.num_rows == 0:
+            return
+
+        post_ids = [int(post_id) for post_id in batch.column('post_id').to_pylist()]
+        dates = batch.column('date').to_pylist()
+
+        # The walk is contiguous, so everything from its start down to the lowest flushed post is stored
+        if self._task_high is None:
+            self._task_high = max(post_ids)
+        self.cover(min(post_ids), self._task_high)
+        self._cover_dates(min(dates).date().isoformat(), max(dates).date().isoformat())
+        self.save()
+
+
+    def complete(self, stop_at, end, start_date=None):
+        """
+        This function marks the current walk as finished and saves the manifest.
+        Only a walk that reached the 'stop_at' post id closes the gap to the range
+        below it, a walk that reached 'start_date' first leaves the gap open.
+
+        Parameters:
+        - stop_at (int): The post id the walk had to stop at, None for no limit.
+
+        - end (str): How the walk ended, see 'on_end' of 'iter_posts', or None
+          if it did not end.
+
+        - start_date (str): The date from which the walk scraped posts, in the format
+          'YYYY-MM-DD'. The default value is None, the beginning of the channel.
+
+        Returns:
+            None
+        """
+        if self._task_high is not None:
+            # The walk reached the range below it, or the beginning of the channel
+            if end == 'stop_at' and stop_at is not None and self._task_high >= stop_at:
+                self.cover(stop_at, self._task_high)
+            elif end == 'channel':
+                self.cover(stop_at or 1, self._task_high)
+
+        # A walk without a lower post id reached the start date below the oldest stored post
+        if end == 'start_date' and stop_at is None and start_date is not None:
+            self.floor_date = min(filter(None, [self.floor_date, start_date]))
+        self._task_high = None
+        self.save()
+
+
+    def add_file(self, file_name):
+        """
+        This function records an output file written for the channel.
+
+        Returns:
+            None
+        """
+        if file_name not in self.files:
+            self.files.append(file_name)
+
+
+    def _cover_dates(self, first_date, last_date):
+        self.first_date = min(filter(None, [self.first_date, first_date]))
+        self.last_date = max(filter(None, [self.last_date, last_date]))
@@ -0,0 +1,226 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import os
+import threading
+import time
+
+
+# Upper bounds of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # seconds
+
+# Pipeline stages, in the order they are reported
+STAGES = ('fetch', 'parse', 'filter', 'build', 'transform', 'write')
+
+
+class Metrics:
+    """
+    This class collects counters and latency histograms of the pipeline stages:
+    page fetch, HTML parse, date filtering, batch building and parquet write.
+
+    Histograms have fixed buckets, so memory use does not grow with the run.
+    'observe' has the signature of the 'on_timing' hooks of ChannelScraper,
+    'iter_posts', 'iter_batches' and ParquetBatchWriter. The metrics can be
+    exported as JSON or in the Prometheus text format, to a file or a local
+    HTTP endpoint, while the run is in progress.
+
+    Parameters:
+    - buckets (tuple): The upper bounds of the histogram buckets in seconds.
+      The default value is BUCKETS.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, stage, seconds, items=1):
+        """
+        This function records a single run of a stage.
+
+        Parameters:
+        - stage (str): The stage name.
+
+        - seconds (float): The duration of the run.
+
+        - items (int): The number of pages, posts or rows processed by the run.
+          The default value is 1.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0, 'items': 0}
+            histogram = self._stages[stage]
+
+            # The last bucket holds the durations above every bound
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            histogram['counts'][index] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            histogram['items'] += items
+
+
+    def _quantile(self, histogram, q):
+        # Estimate a quantile as the upper bound of the bucket it falls into
+        rank = q * histogram['count']
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), histogram['counts']):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+    def to_dict(self):
+        """
+        This function returns a snapshot of the metrics.
+
+        Returns:
+            dict with the run duration and, for every stage, the number of runs,
+            processed items, total seconds, estimated p50/p90/p99 seconds
+            and the histogram buckets.
+        """
+        with self._lock:
+            stages = {stage: dict(histogram, counts=list(histogram['counts'])) for stage, histogram in self._stages.items()}
+
+        ordered = sorted(stages, key=lambda stage: (STAGES.index(stage) if stage in STAGES else len(STAGES), stage))
+        return {
+            'uptime_seconds': round(time.time() - self.started, 3),
+            'stages': {
+                stage: {
+                    'count': stages[stage]['count'],
+                    'items': stages[stage]['items'],
+                    'seconds': round(stages[stage]['sum'], 6),
+                    'p50': self._quantile(stages[stage], 0.50),
+                    'p90': self._quantile(stages[stage], 0.90),
+                    'p99': self._quantile(stages[stage], 0.99),
+                    'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], stages[stage]['counts'])),
+                    }
+                for stage in ordered
+                },
+            }
+
+
+    def to_json(self):
+        """
+        This function returns the metrics as a JSON document.
+
+        Returns:
+            str
+        """
+        # Infinite quantiles are not valid JSON
+        return json.dumps(self.to_dict(), indent=2).replace('Infinity', '"+Inf"')
+
+
+    def to_prometheus(self):
+        """
+        This function returns the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str
+        """
+        snapshot = self.to_dict()
+        lines = [
+            '# HELP tg_scraper_uptime_seconds Seconds since the run started.',
+            '# TYPE tg_scraper_uptime_seconds gauge',
+            f"tg_scraper_uptime_seconds {snapshot['uptime_seconds']}",
+            '# HELP tg_scraper_stage_seconds Duration of a pipeline stage run.',
+            '# TYPE tg_scraper_stage_seconds histogram',
+            ]
+
+        for stage, summary in snapshot['stages'].items():
+            total = 0
+            for bound, count in summary['buckets'].items():
+                total += count
+                lines.append(f'tg_scraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {total}')
+            lines.append(f'tg_scraper_stage_seconds_sum{{stage="{stage}"}} {summary["seconds"]}')
+            lines.append(f'tg_scraper_stage_seconds_count{{stage="{stage}"}} {summary["count"]}')
+
+        lines += [
+            '# HELP tg_scraper_stage_items_total Pages, posts or rows processed by a pipeline stage.',
+            '# TYPE tg_scraper_stage_items_total counter',
+            ]
+        for stage, summary in snapshot['stages'].items():
+            lines.append(f'tg_scraper_stage_items_total{{stage="{stage}"}} {summary["items"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def export(self, path):
+        """
+        This function atomically writes the metrics to a file, as JSON if the file
+        name ends with '.json', else in the Prometheus text format.
+
+        Returns:
+            None
+        """
+        text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+    def start_export(self, path, interval=10.0):
+        """
+        This function exports the metrics to a file every 'interval' seconds
+        on a background thread, until the returned function is called.
+
+        Returns:
+            callable: It stops the exports after a final one.
+        """
+        stopped = threading.Event()
+
+        def export_loop():
+            while not stopped.wait(interval):
+                self.export(path)
+            self.export(path)
+
+        thread = threading.Thread(target=export_loop, daemon=True)
+        thread.start()
+
+        def stop():
+            stopped.set()
+            thread.join()
+
+        return stop
+
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        This function serves the metrics over HTTP on a background thread:
+        '/metrics' in the Prometheus text format and '/metrics.json' as JSON.
+
+        Returns:
+            ThreadingHTTPServer: Call its 'shutdown()' to stop serving.
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = metrics.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+
+
+# Initial, minimum and maximum number of requests per second
+RATE = 1.0
+MIN_RATE = 0.1
+MAX_RATE = 10.0
+
+# Number of requests that can be made at once after an idle period
+BURST = 2
+
+# Requests per second added after every healthy response
+RATE_INCREASE = 0.05
+
+# Rate multiplier after a throttled, failed or slow response
+RATE_DECREASE = 0.5
+
+# A response is slow if it took this many times longer than the usual latency
+SLOW_FACTOR = 3.0
+
+# First and maximum pause after consecutive unhealthy responses
+BACKOFF = 1.0 # seconds
+MAX_BACKOFF = 60.0 # seconds
+
+
+class RateController:
+    """
+    This class throttles requests with a token bucket and adapts its rate to the server.
+
+    Every request takes a token, and tokens refill at the current rate up to 'burst'.
+    While responses stay healthy the rate grows by 'increase' per response. A 429,
+    a 5xx or a response much slower than the usual latency cuts the rate by 'decrease'
+    and pauses all requests for an exponentially growing, jittered period.
+    A controller is thread-safe, so concurrent scrapes can share its budget,
+    see 'for_host'.
+
+    Parameters:
+    - rate (float): The initial number of requests per second. The default value is RATE.
+
+    - min_rate (float): The lowest number of requests per second. The default value is MIN_RATE.
+
+    - max_rate (float): The highest number of requests per second. The default value is MAX_RATE.
+
+    - burst (int): The size of the token bucket. The default value is BURST.
+
+    - increase (float): The rate added after a healthy response. The default value is RATE_INCREASE.
+
+    - decrease (float): The rate multiplier after an unhealthy response. The default value is RATE_DECREASE.
+    """
+
+    _hosts = {}
+    _hosts_lock = threading.Lock()
+
+    def __init__(self, rate=RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST, increase=RATE_INCREASE, decrease=RATE_DECREASE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.failures = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._latency = None
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def for_host(cls, host, **kwargs):
+        """
+        This function returns the controller shared by all scrapes against the host
+        in the current process, creating it with 'kwargs' on first use.
+
+        Returns:
+            RateController
+        """
+        with cls._hosts_lock:
+            if host not in cls._hosts:
+                cls._hosts[host] = cls(**kwargs)
+            return cls._hosts[host]
+
+
+    def acquire(self):
+        """
+        This function blocks until a request is allowed and takes a token for it.
+
+        Returns:
+            None
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+            # Sleep outside the lock, so other threads can record responses meanwhile
+            time.sleep(wait)
+
+
+    def record(self, status_code, latency):
+        """
+        This function adapts the rate to a response.
+
+        Parameters:
+        - status_code (int): The response status code, or None if the request failed.
+
+        - latency (float): The number of seconds the request took.
+
+        Returns:
+            bool: True if the response was healthy.
+        """
+        with self._lock:
+            slow = self._latency is not None and latency > SLOW_FACTOR * self._latency
+            healthy = status_code is not None and status_code != 429 and status_code < 500 and not slow
+
+            # Exponential moving average of response latencies, it follows a lasting slowdown too
+            if status_code is not None:
+                self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+
+            if healthy:
+                self.failures = 0
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                return True
+
+            self.failures += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = 0
+
+            # Slow responses only lower the rate, throttling and errors also pause requests
+            if not slow:
+                backoff = min(MAX_BACKOFF, BACKOFF * 2 ** (self.failures - 1))
+                self._paused_until = max(self._paused_until, time.monotonic() + random.uniform(backoff / 2, backoff))
+            return False
@@ -0,0 +1,272 @@
+from datetime import datetime, timedelta, timezone
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from tg_scraper.channel import ChannelScraper, post_id
+from tg_scraper.writer import SCHEMA
+
+
+def _timed(on_timing, stage, start, items):
+    if on_timing is not None:
+        on_timing(stage, time.perf_counter() - start, items)
+
+
+def _skip_seen(seen, post_ids, stop_after, known_run):
+    # Marks the posts of a page, newest first, to keep, and counts the run of stored ones.
+    # Returns the marks, the run length and, once the run reaches 'stop_after', the lowest
+    # id of the stored range the run ends in, where the walk continues below, else None.
+    if not post_ids:
+        return [], known_run, None
+
+    # A page stored as a whole takes a single lookup
+    if seen.contains_all(min(post_ids), max(post_ids)):
+        known = [True] * len(post_ids)
+    else:
+        known = [post_id in seen for post_id in post_ids]
+
+    keep = []
+    for current_id, is_known in zip(post_ids, known):
+        known_run = known_run + 1 if is_known else 0
+        if stop_after is not None and known_run >= stop_after:
+            return keep, known_run, seen.range_of(current_id)[0]
+        keep.append(not is_known)
+    return keep, known_run, None
+
+
+def _walk_end(jump, stop_at):
+    # How a walk ends below a skipped stored range, or None if it continues below it
+    if jump is None or jump <= 1:
+        return 'channel'
+    if stop_at is not None and jump - 1 <= stop_at:
+        return 'stop_at'
+    return None
+
+
+def _ended(on_end, end):
+    if on_end is not None:
+        on_end(end)
+
+
+def iter_posts(channel_name, start_date, finish_date, verbose=True, before=None, stop_at=None, seek=False, request_limit=None, rate_controller=None, cache=None, base_url='https://t.me', on_timing=None, seen=None, stop_after=None, stop=None, on_end=None):
+    """
+    This function scrapes a specified Telegram channel for posts within a date range.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel to scrape.
+
+    - start_date (str): The date from which to start scraping posts.
+      The date should be in the format 'YYYY-MM-DD'.
+
+    - finish_date (str): The date up to which (including it) the posts will be scraped.
+      The date should be in the format 'YYYY-MM-DD'.
+
+    - verbose (bool): If False, the function will substitute post content with '#####'.
+      The default value is True.
+
+    - before (int): If provided, scraping starts from the newest post with an id
+      lower than this value instead of the newest post in the channel.
+      The default value is None.
+
+    - stop_at (int): If provided, scraping stops at the post with this id or lower,
+      which is not yielded. The default value is None.
+
+    - seek (bool): If True and 'before' is not provided, the function binary searches
+      for the newest post published on or before 'finish_date' and starts from it,
+      instead of paging through all newer posts. The default value is False.
+
+    - request_limit (threading.Semaphore): If provided, it caps the number of
+      concurrent requests shared with other scrapers. The default value is None.
+
+    - rate_controller (RateController): The controller throttling page requests.
+      The default value is the controller shared by all scrapers of t.me in the process.
+
+    - cache (PageCache): If provided, pages are read from and stored in the cache.
+      The default value is None.
+
+    - base_url (str): The address of the t.me server. The default value is 'https://t.me'.
+
+    - on_timing (callable): If provided, it is called with the stage name ('fetch',
+      'parse', 'filter' or 'build'), its duration in seconds and the number of
+      processed items for every page, see Metrics.observe. The default value is None.
+
+    - seen (SeenIndex): If provided, posts already stored in the index are skipped.
+      The default value is None.
+
+    - stop_after (int): If provided with 'seen', once this many consecutive posts
+      are already stored, the walk jumps right below the stored range holding them
+      instead of paging through it. The default value is None.
+
+    - stop (threading.Event): If provided, scraping stops before the next page
+      once it is set, also while no post is yielded. The default value is None.
+
+    - on_end (callable): If provided, it is called with how the walk ended once it
+      is over: 'stop_at' if it reached the 'stop_at' post, 'start_date' if it reached
+      a post published before 'start_date' first, or 'channel' if the channel has
+      no older posts. It is not called for a walk that was stopped or abandoned.
+      The default value is None.
+
+    Returns:
+    - This function yields posts from the newest to the oldest one.
+      Each post is represented as a dictionary with keys for different attributes
+      of the post (post_id, post_url, date, content).
+    """
+    # Create a Telegram channel scraper
+    channel = ChannelScraper(channel_name, before=before, request_limit=request_limit, rate_controller=rate_controller, cache=cache, base_url=base_url, on_timing=on_timing)
+
+    # Convert date string to date object
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    finish = datetime.strptime(finish_date, '%Y-%m-%d').date()
+
+    # Jump right to the requested date range instead of walking back from the newest post
+    if seek and before is None:
+        channel.before = channel.seek(finish)
+
+    known_run = 0
+    cursor = channel.before
+    while True:
+        jump = None
+        for page in channel.get_pages(cursor):
+            if stop is not None and stop.is_set():
+                return
+
+            started = time.perf_counter()
+            posts = []
+            post_ids = []
+            end = None
+
+            for post in page:
+                # The id is parsed from the post url once and reused for the filters and the row
+                current_id = post_id(post)
+
+                # Stop at the posts which were already stored by a previous run
+                if stop_at is not None and current_id <= stop_at:
+                    end = 'stop_at'
+                    break
+
+                # Skip posts newer than the upper date boundary instead of stopping on them
+                if post.date.date() > finish:
+                    continue
+
+                # Posts are ordered from newer to older, so the rest are out of range too
+                if post.date.date() < start:
+                    end = 'start_date'
+                    break
+
+                posts.append(post)
+                post_ids.append(current_id)
+
+            # Skip the posts stored by previous runs, and jump below a long run of them
+            if seen is not None:
+                keep, known_run, jump = _skip_seen(seen, post_ids, stop_after, known_run)
+                posts = [post for post, kept in zip(posts, keep) if kept]
+                post_ids = [current_id for current_id, kept in zip(post_ids, keep) if kept]
+
+            _timed(on_timing, 'filter', started, len(page))
+
+            started = time.perf_counter()
+            rows = [{
+                'post_id': current_id,
+                'post_url': post.url,
+                'date': post.date,
+                'content': post.content if verbose else '#####'
+                } for current_id, post in zip(post_ids, posts)]
+            _timed(on_timing, 'build', started, len(rows))
+
+            yield from rows
+
+            if end is not None:
+                _ended(on_end, end)
+                return
+            if jump is not None:
+                break
+
+        # The channel ends, or the walk continues right below the skipped stored range
+        end = _walk_end(jump, stop_at)
+        if end is not None:
+            _ended(on_end, end)
+            return
+        cursor, known_run = jump, 0
+
+
+def iter_batches(channel_name, start_date, finish_date, verbose=True, before=None, stop_at=None, seek=False, request_limit=None, rate_controller=None, cache=None, base_url='https://t.me', on_timing=None, seen=None, stop_after=None, stop=None, on_end=None, channel=None):
+    """
+    This function scrapes a specified Telegram channel for posts within a date range,
+    like 'iter_posts', but extracts every page straight into Arrow columns with lxml
+    and filters it as a whole, without building Python objects for every post.
+    The parameters are the same as in 'iter_posts', and 'channel' is a ChannelScraper
+    to reuse, with its open connection, instead of creating a new one; 'request_limit',
+    'rate_controller', 'cache', 'base_url' and 'on_timing' are then taken from it.
+
+    Returns:
+    - This function yields a pyarrow.RecordBatch with the output file schema
+      for every page with posts in the range, from the newest to the oldest posts.
+    """
+    # Create a Telegram channel scraper, or start a new walk of an existing one
+    if channel is None:
+        channel = ChannelScraper(channel_name, before=before, request_limit=request_limit, rate_controller=rate_controller, cache=cache, base_url=base_url, on_timing=on_timing)
+    else:
+        channel.before = before
+        on_timing = channel.on_timing
+
+    # Convert date strings to UTC timestamps of the range boundaries
+    start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    finish = datetime.strptime(finish_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    lower = pa.scalar(start, SCHEMA.field('date').type)
+    upper = pa.scalar(finish + timedelta(days=1), SCHEMA.field('date').type)
+
+    # Jump right to the requested date range instead of walking back from the newest post
+    if seek and before is None:
+        channel.before = channel.seek(finish.date())
+
+    known_run = 0
+    cursor = channel.before
+    while True:
+        jump = None
+        for batch in channel.get_batches(cursor, verbose):
+            if stop is not None and stop.is_set():
+                return
+
+            started = time.perf_counter()
+            dates = batch.column('date')
+
+            # Keep posts within the dates, posts are ordered from newer to older, so the rest of the channel is older once a post is
+            keep = pc.and_(pc.greater_equal(dates, lower), pc.less(dates, upper))
+            older = pc.less(dates, lower)
+            end = 'start_date' if pc.any(older).as_py() else None
+
+            # Stop at the posts which were already stored by a previous run, unless a newer post is older than the dates
+            if stop_at is not None:
+                post_ids = batch.column('post_id')
+                keep = pc.and_(keep, pc.greater(post_ids, stop_at))
+                if pc.min(post_ids).as_py() <= stop_at and not pc.any(pc.and_(older, pc.greater(post_ids, stop_at))).as_py():
+                    end = 'stop_at'
+
+            _timed(on_timing, 'filter', started, batch.num_rows)
+
+            started = time.perf_counter()
+            batch = batch.filter(keep)
+
+            # Skip the posts stored by previous runs, and jump below a long run of them
+            if seen is not None:
+                keep, known_run, jump = _skip_seen(seen, batch.column('post_id').to_pylist(), stop_after, known_run)
+                batch = batch.slice(0, len(keep)).filter(pa.array(keep, pa.bool_()))
+
+            _timed(on_timing, 'build', started, batch.num_rows)
+
+            if batch.num_rows:
+                yield batch
+
+            if end is not None:
+                _ended(on_end, end)
+                return
+            if jump is not None:
+                break
+
+        # The channel ends, or the walk continues right below the skipped stored range
+        end = _walk_end(jump, stop_at)
+        if end is not None:
+            _ended(on_end, end)
+            return
+        cursor, known_run = jump, 0
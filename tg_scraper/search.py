@@ -0,0 +1,210 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import pyarrow.compute as pc
+from pyarrow.parquet import ParquetFile
+
+from tg_scraper.dataset import channel_files
+
+
+# File name of the search index in the output folder, shared by all channels
+INDEX_NAME = 'tg-search.sqlite'
+
+# Number of matching posts returned by a query
+LIMIT = 20
+
+# Posts are kept once per channel and post id, their contents only in the full-text index.
+# The index is contentless, so it stores the search terms but not a second copy of the posts.
+TABLES = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    post_id INTEGER NOT NULL,
+    post_url TEXT NOT NULL,
+    date TEXT NOT NULL,
+    UNIQUE (channel, post_id)
+);
+CREATE INDEX IF NOT EXISTS posts_date ON posts (channel, date);
+CREATE VIRTUAL TABLE IF NOT EXISTS contents USING fts5(content, content='', tokenize='unicode61 remove_diacritics 2');
+"""
+
+
+class SearchIndex:
+    """
+    This class keeps a local full-text index of the post contents, an SQLite
+    FTS5 table keyed by channel and post id with the post urls and dates.
+
+    The index is fed by the writer: 'recorder' returns an 'on_flush' handler which
+    adds every flushed row group in one transaction, skipping the posts already
+    indexed, so it follows incremental and deduplicated runs without rescanning
+    the stored files. Existing files can be added once with 'add_file'.
+
+    Parameters:
+    - folder (str): The folder of the index file. The default value is 'data'.
+    """
+
+    def __init__(self, folder='data'):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_NAME)
+        os.makedirs(folder, exist_ok=True)
+
+        # Concurrent runs wait for each other instead of failing on a locked database
+        self._connection = sqlite3.connect(self.path, timeout=60)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(TABLES)
+
+
+    def __len__(self):
+        return self._connection.execute('SELECT count(*) FROM posts').fetchone()[0]
+
+
+    def add_batch(self, channel_name, batch):
+        """
+        This function indexes the posts of a record batch (or table) of a channel.
+        Posts already in the index are skipped.
+
+        Returns:
+            int: The number of newly indexed posts.
+        """
+        if batch.num_rows == 0:
+            return 0
+
+        rows = zip(
+            batch.column('post_id').to_pylist(),
+            batch.column('post_url').to_pylist(),
+            # Whole seconds, strftime adds the fraction of timestamps in microseconds
+            pc.utf8_slice_codeunits(pc.strftime(batch.column('date'), '%Y-%m-%d %H:%M:%S'), 0, 19).to_pylist(),
+            batch.column('content').to_pylist(),
+            )
+
+        with self._connection:
+            # Take the write lock before reading the maximum, so another indexer cannot add posts above it meanwhile
+            self._connection.execute('BEGIN IMMEDIATE')
+
+            # New posts get ids above the current maximum, only they are added to the full-text index
+            last_id = self._connection.execute('SELECT coalesce(max(id), 0) FROM posts').fetchone()[0]
+            self._connection.execute('CREATE TEMP TABLE IF NOT EXISTS staged (post_id INTEGER, post_url TEXT, date TEXT, content TEXT)')
+            self._connection.execute('DELETE FROM staged')
+            self._connection.executemany('INSERT INTO staged VALUES (?, ?, ?, ?)', rows)
+            self._connection.execute('INSERT OR IGNORE INTO posts (channel, post_id, post_url, date) SELECT ?, post_id, post_url, date FROM staged', (channel_name,))
+            added = self._connection.execute("""
+                INSERT INTO contents (rowid, content)
+                SELECT posts.id, staged.content FROM staged JOIN posts ON posts.channel = ? AND posts.post_id = staged.post_id
+                WHERE posts.id > ? AND staged.content IS NOT NULL
+                """, (channel_name, last_id)).rowcount
+            self._connection.execute('DELETE FROM staged')
+        return added
+
+
+    def recorder(self, channel_name):
+        """
+        This function returns a handler which indexes the flushed row groups of a channel.
+        It can be passed to ParquetBatchWriter as 'on_flush'.
+
+        Returns:
+            callable
+        """
+        def record_batch(batch):
+            self.add_batch(channel_name, batch)
+        return record_batch
+
+
+    def add_file(self, channel_name, path):
+        """
+        This function indexes the posts of an existing parquet file, one row group at a time.
+
+        Returns:
+            int: The number of newly indexed posts.
+        """
+        parquet_file = ParquetFile(path)
+        return sum(
+            self.add_batch(channel_name, parquet_file.read_row_group(i, columns=['post_id', 'post_url', 'date', 'content']))
+            for i in range(parquet_file.num_row_groups)
+            )
+
+
+    def search(self, query, channel_name=None, start_date=None, finish_date=None, limit=LIMIT):
+        """
+        This function finds the posts matching a full-text query, best matches first.
+
+        Parameters:
+        - query (str): The FTS5 query, e.g. 'word', '"exact phrase"', 'prefix*' or 'one OR two'.
+
+        - channel_name (str): If provided, only the posts of this channel are searched.
+          The default value is None.
+
+        - start_date (str): If provided, only posts published on or after this UTC date,
+          in the format 'YYYY-MM-DD', are searched. The default value is None.
+
+        - finish_date (str): If provided, only posts published on or before this UTC date
+          are searched. The default value is None.
+
+        - limit (int): The maximum number of returned posts. The default value is LIMIT.
+
+        Returns:
+            list of (channel, post_id, post_url, date) tuples.
+        """
+        conditions, parameters = ['contents MATCH ?'], [query]
+        if channel_name:
+            conditions.append('posts.channel = ?')
+            parameters.append(channel_name)
+        if start_date:
+            conditions.append('posts.date >= ?')
+            parameters.append(start_date)
+        if finish_date:
+            # Dates are 'YYYY-MM-DD HH:MM:SS' strings, so every time of the day sorts before 'YYYY-MM-DD 24'
+            conditions.append('posts.date < ?')
+            parameters.append(f"{finish_date} 24")
+
+        return self._connection.execute(f"""
+            SELECT posts.channel, posts.post_id, posts.post_url, posts.date
+            FROM contents JOIN posts ON posts.id = contents.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY contents.rank
+            LIMIT ?
+            """, parameters + [limit]).fetchall()
+
+
+    def close(self):
+        self._connection.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search the contents of scraped Telegram posts.')
+    parser.add_argument('query', nargs='?', help="full-text query, e.g. 'word', '\"exact phrase\"', 'prefix*' or 'one OR two'")
+    parser.add_argument('--channel', help='only search this channel')
+    parser.add_argument('--start', help='the first date to search, YYYY-MM-DD')
+    parser.add_argument('--finish', help='the last date to search, YYYY-MM-DD')
+    parser.add_argument('--limit', type=int, default=LIMIT, help=f'number of returned posts ({LIMIT} by default)')
+    parser.add_argument('--folder', default='data', help="folder of the index and the output files ('data' by default)")
+    parser.add_argument('--add', action='store_true', help="index the output files of --channel already in the folder, once")
+    args = parser.parse_args()
+
+    if args.add == bool(args.query):
+        parser.error('either a query or --add is required')
+    if args.add and not args.channel:
+        parser.error('--add requires --channel')
+
+    with SearchIndex(args.folder) as index:
+        if args.add:
+            print(f"\n🧲 Indexing the stored posts of '{args.channel}'...\n")
+            added = sum(index.add_file(args.channel, path) for path in channel_files(args.folder, args.channel))
+            print(f"✔️ Indexed {added} new posts, the index has {len(index)} posts.")
+        else:
+            start = time.perf_counter()
+            results = index.search(args.query, args.channel, args.start, args.finish, args.limit)
+            elapsed = time.perf_counter() - start
+
+            for channel, post_id, post_url, post_date in results:
+                print(f"◻️ {post_date}  {post_url}")
+            print(f"\n🔹 Found {len(results)} posts in {elapsed * 1000:.1f} ms.")
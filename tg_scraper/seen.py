@@ -0,0 +1,246 @@
+from bisect import bisect_right
+import argparse
+import glob
+import json
+import os
+
+import pyarrow.dataset as ds
+from pyarrow.parquet import read_table
+
+from tg_scraper.writer import SUFFIXES
+
+
+# Number of consecutive stored posts after which a walk jumps below their stored range, a bit over two pages
+STOP_AFTER = 50
+
+
+def _runs(post_ids):
+    # Sorted [low, high] runs of consecutive ids
+    runs = []
+    for post_id in sorted(set(post_ids)):
+        if runs and post_id == runs[-1][1] + 1:
+            runs[-1][1] = post_id
+        else:
+            runs.append([post_id, post_id])
+    return runs
+
+
+class SeenIndex:
+    """
+    This class keeps a persistent per-channel index of the post ids already stored
+    in the output files, as sorted ranges of consecutive ids. Telegram ids grow by one
+    with every post, so a channel without deleted posts is a single range, and
+    checking a post or a whole page takes a binary search over a few ranges.
+
+    The index is a small JSON file next to the output files, updated after every
+    flushed row group. It can always be rebuilt from the stored posts, see 'rebuild'.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel.
+
+    - folder (str): The folder with the output files and the index.
+      The default value is 'data'.
+    """
+
+    def __init__(self, channel_name, folder='data'):
+        self.channel_name = channel_name
+        self.folder = folder
+        self.ranges = []
+        self._lows = []
+
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, f"tg-seen-{self.channel_name}.json")
+
+
+    def __len__(self):
+        return sum(high - low + 1 for low, high in self.ranges)
+
+
+    @classmethod
+    def load(cls, channel_name, folder='data'):
+        """
+        This function loads the index of a channel, or rebuilds it from
+        the stored posts if it does not exist yet.
+
+        Returns:
+            SeenIndex
+        """
+        index = cls(channel_name, folder)
+
+        if not os.path.exists(index.path):
+            return cls.rebuild(channel_name, folder)
+
+        with open(index.path, encoding='utf-8') as f:
+            index._set_ranges(json.load(f)['ranges'])
+        return index
+
+
+    @classmethod
+    def rebuild(cls, channel_name, folder='data', exclude=()):
+        """
+        This function builds the index of a channel from the post ids of its
+        'tg-posts-<channel_name>-*' files and its dataset partitions in the folder,
+        and saves it. The file names in 'exclude' are skipped, e.g. a file
+        that is being overwritten.
+
+        Returns:
+            SeenIndex
+        """
+        index = cls(channel_name, folder)
+
+        paths = glob.glob(os.path.join(folder, f"tg-posts-{channel_name}-*.parquet*"))
+        for path in sorted(path for path in paths if path.endswith(tuple(SUFFIXES.values()))):
+            if os.path.basename(path) in exclude:
+                continue
+            index.add(read_table(path, columns=['post_id']).column('post_id').to_pylist())
+
+        channel_folder = os.path.join(folder, f"channel={channel_name}")
+        if os.path.isdir(channel_folder):
+            index.add(ds.dataset(channel_folder, format='parquet').to_table(columns=['post_id']).column('post_id').to_pylist())
+
+        index.save()
+        return index
+
+
+    def save(self):
+        """
+        This function atomically writes the index to its JSON file.
+
+        Returns:
+            None
+        """
+        state = {
+            'channel': self.channel_name,
+            'posts': len(self),
+            'ranges': self.ranges,
+        }
+
+        # Replace the index in one step, so an interruption never leaves a broken file
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+    def _set_ranges(self, ranges):
+        self.ranges = [list(r) for r in ranges]
+        self._lows = [low for low, _ in self.ranges]
+
+
+    def _range_of(self, post_id):
+        # Index of the range holding the post id, or -1
+        k = bisect_right(self._lows, post_id) - 1
+        return k if k >= 0 and post_id <= self.ranges[k][1] else -1
+
+
+    def __contains__(self, post_id):
+        return self._range_of(post_id) >= 0
+
+
+    def range_of(self, post_id):
+        """
+        This function returns the range of stored posts holding a post id.
+
+        Returns:
+            list: The [low, high] ids of the range, or None if the post is not stored.
+        """
+        k = self._range_of(post_id)
+        return self.ranges[k] if k >= 0 else None
+
+
+    def contains_all(self, low, high):
+        """
+        This function checks whether all post ids from 'low' to 'high'
+        (including both) are stored, e.g. all posts of a page.
+
+        Returns:
+            bool
+        """
+        k = self._range_of(low)
+        return k >= 0 and high <= self.ranges[k][1]
+
+
+    def add(self, post_ids):
+        """
+        This function adds post ids to the index, merging them into
+        the overlapping or adjacent ranges.
+
+        Returns:
+            None
+        """
+        self.add_ranges(_runs(post_ids))
+
+
+    def remove(self, post_ids):
+        """
+        This function removes post ids from the index, e.g. the posts of a file
+        that is about to be overwritten, splitting the ranges holding them.
+
+        Returns:
+            None
+        """
+        runs = _runs(post_ids)
+        ranges = []
+        k = 0
+        for low, high in self.ranges:
+            # Runs are sorted, so the ones ending below this range are done
+            while k < len(runs) and runs[k][1] < low:
+                k += 1
+            j = k
+            while j < len(runs) and runs[j][0] <= high:
+                if runs[j][0] > low:
+                    ranges.append([low, runs[j][0] - 1])
+                low = max(low, runs[j][1] + 1)
+                j += 1
+            if low <= high:
+                ranges.append([low, high])
+        self._set_ranges(ranges)
+
+
+    def add_ranges(self, ranges):
+        """
+        This function adds ranges of post ids, [low, high] pairs including both ends,
+        to the index, merging them into the overlapping or adjacent ranges.
+
+        Returns:
+            None
+        """
+        if not ranges:
+            return
+
+        ranges = sorted(self.ranges + [list(r) for r in ranges])
+        merged = [ranges[0]]
+        for r in ranges[1:]:
+            if r[0] <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], r[1])
+            else:
+                merged.append(r)
+        self._set_ranges(merged)
+
+
+    def record_batch(self, batch):
+        """
+        This function adds the posts of a flushed batch to the index and saves it.
+        It can be passed to ParquetBatchWriter as 'on_flush'.
+
+        Returns:
+            None
+        """
+        if batch.num_rows == 0:
+            return
+
+        self.add(batch.column('post_id').to_pylist())
+        self.save()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the index of stored posts of a Telegram channel from its output files.')
+    parser.add_argument('channel', help="the XXXX part in 'https://web.telegram.org/k/#@XXXX'")
+    parser.add_argument('--folder', default='data', help="folder with the output files ('data' by default)")
+    args = parser.parse_args()
+
+    index = SeenIndex.rebuild(args.channel, args.folder)
+
+    print(f"✔️ Indexed {len(index)} stored posts of '{args.channel}' in {len(index.ranges)} ranges.")
@@ -0,0 +1,206 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow.parquet import read_table
+
+from tg_scraper.cache import PageCache
+from tg_scraper.channel import ChannelScraper
+from tg_scraper.rate import RateController, RATE
+from tg_scraper.scrape import iter_batches, iter_posts
+from tg_scraper.writer import ParquetBatchWriter, BATCH_SIZE, COMPRESSION, SUFFIXES, file_suffix
+
+
+# Number of shards scraped at the same time
+SHARDS = 4
+
+
+def split_range(low, high, shards):
+    """
+    This function splits the post ids from 'low' to 'high' (including both)
+    into at most 'shards' disjoint ranges of almost equal size.
+
+    Returns:
+        list of (low, high) tuples, in ascending order
+    """
+    size = high - low + 1
+    shards = max(1, min(shards, size))
+    bounds = [low + size * k // shards for k in range(shards + 1)]
+    return [(bounds[k], bounds[k + 1] - 1) for k in range(shards)]
+
+
+def find_id_range(channel_name, start_date, finish_date, cache=None):
+    """
+    This function finds the range of post ids published between the dates
+    (including both) by binary searching the channel.
+
+    Returns:
+        (low, high) tuple, or None if there are no posts in the range.
+    """
+    channel = ChannelScraper(channel_name, cache=cache)
+
+    newest = channel.newest_post_id()
+    if newest is None:
+        return None
+
+    # Posts below the 'before' cursor of a date are published on or before it
+    finish = datetime.strptime(finish_date, '%Y-%m-%d').date()
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    high = (channel.seek(finish) or newest + 1) - 1
+    low = channel.seek(start - timedelta(days=1))
+
+    # Every post is published before the start date
+    if low is None:
+        return None
+
+    return (low, high) if low <= high else None
+
+
+def scrape_shard(channel_name, start_date, finish_date, low, high, path, rate=RATE, verbose=True, cache=None, fast=False):
+    """
+    This function scrapes the posts with ids from 'low' to 'high' (including both)
+    into a separate parquet file, starting at 'rate' requests per second.
+    If 'fast' is True, pages are extracted straight into Arrow columns, see 'iter_batches'.
+
+    Returns:
+        int: The number of scraped posts.
+    """
+    rate_controller = RateController(rate=rate)
+
+    with ParquetBatchWriter(path) as writer:
+        if fast:
+            for batch in iter_batches(channel_name, start_date, finish_date, verbose, before=high + 1, stop_at=low - 1, rate_controller=rate_controller, cache=cache):
+                writer.write_batch(batch)
+        else:
+            for post in iter_posts(channel_name, start_date, finish_date, verbose, before=high + 1, stop_at=low - 1, rate_controller=rate_controller, cache=cache):
+                writer.write(post)
+
+    return writer.rows_written
+
+
+def merge_shards(paths, output_path, writer_options=None):
+    """
+    This function merges shard files of ascending, disjoint id ranges into a single
+    parquet file sorted by post_id, without duplicates. Only one shard is held
+    in memory at a time. 'writer_options' are passed to ParquetBatchWriter.
+
+    Returns:
+        int: The number of posts in the output file.
+    """
+    with ParquetBatchWriter(output_path, **(writer_options or {})) as writer:
+        for path in paths:
+            table = read_table(path, schema=writer.schema)
+            post_ids = table.column('post_id')
+
+            # Posts are scraped from newer to older, so every shard has to be reversed
+            order = pc.sort_indices(post_ids)
+            table = table.take(order)
+            post_ids = post_ids.take(order)
+
+            # Keep the first of posts with the same id
+            if len(post_ids) > 1:
+                unique = pc.not_equal(post_ids[1:], post_ids[:-1])
+                table = table.filter(pa.concat_arrays([pa.array([True]), unique.combine_chunks()]))
+
+            writer.write_batch(table)
+
+    return writer.rows_written
+
+
+def scrape_sharded(channel_name, start_date, finish_date, output_path, shards=SHARDS, rate=RATE, verbose=True, cache=None, fast=False, writer_options=None):
+    """
+    This function scrapes a single channel in parallel. The post ids of the date range
+    are split into disjoint shards and every shard is scraped by its own process,
+    starting from its highest id with the 'before=<post_id>' pagination. Separate
+    processes, unlike threads, also parse the pages in parallel. The shards are
+    then merged into a single parquet file sorted by post_id. Processes cannot
+    share a rate controller, so every shard starts with an equal part of 'rate'.
+
+    Parameters:
+    - channel_name (str): The name of the Telegram channel to scrape.
+
+    - start_date (str): The first date to scrape, in the format 'YYYY-MM-DD'.
+
+    - finish_date (str): The last date to scrape, in the format 'YYYY-MM-DD'.
+
+    - output_path (str): The output file path.
+
+    - shards (int): The number of shards scraped at the same time.
+      The default value is SHARDS.
+
+    - rate (float): The initial number of requests per second of all shards together.
+      The default value is RATE.
+
+    - verbose (bool): If False, post contents are substituted with '#####'.
+      The default value is True.
+
+    - cache (PageCache): If provided, pages are read from and stored in the cache.
+      The default value is None.
+
+    - fast (bool): If True, pages are extracted straight into Arrow columns.
+      The default value is False.
+
+    - writer_options (dict): Keyword arguments of ParquetBatchWriter for the output
+      file, e.g. 'compression', 'compression_level' or 'batch_size'.
+      The default value is None.
+
+    Returns:
+        int: The number of posts in the output file.
+    """
+    id_range = find_id_range(channel_name, start_date, finish_date, cache)
+    ranges = split_range(*id_range, shards) if id_range else []
+    paths = [f"{output_path}.shard-{k}" for k in range(len(ranges))]
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, len(ranges))) as executor:
+            futures = [
+                executor.submit(scrape_shard, channel_name, start_date, finish_date, low, high, path, rate / len(ranges), verbose, cache, fast)
+                for (low, high), path in zip(ranges, paths)
+                ]
+            for future in futures:
+                future.result()
+
+        return merge_shards(paths, output_path, writer_options)
+
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape a single Telegram channel in parallel shards of post ids.')
+    parser.add_argument('channel', help="the XXXX part in 'https://web.telegram.org/k/#@XXXX'")
+    parser.add_argument('--start', default=f"{datetime.today().year}-01-01", help='the first date to scrape, YYYY-MM-DD (beginning of the current year by default)')
+    parser.add_argument('--finish', default=f"{datetime.today().year}-12-31", help='the last date to scrape, YYYY-MM-DD (end of the current year by default)')
+    parser.add_argument('--shards', type=int, default=SHARDS, help=f'shards scraped at the same time ({SHARDS} by default)')
+    parser.add_argument('--folder', default='data', help="output folder ('data' by default)")
+    parser.add_argument('--rate', type=float, default=RATE, help=f'initial requests per second of all shards together, adjusted to the server responses ({RATE} by default)')
+    parser.add_argument('--mask', action='store_true', help="substitute post contents with '#####'")
+    parser.add_argument('--cache', help='folder to cache fetched pages in')
+    parser.add_argument('--replay', action='store_true', help='only read pages from the cache, without network requests')
+    parser.add_argument('--fast', action='store_true', help='extract pages straight into Arrow columns with lxml')
+    parser.add_argument('--compression', choices=list(SUFFIXES), default=COMPRESSION, help=f"compression codec of the output file ('{COMPRESSION}' by default)")
+    parser.add_argument('--compression-level', type=int, help='compression level of the codec (the codec default by default)')
+    parser.add_argument('--row-group-size', type=int, default=BATCH_SIZE, help=f'posts in a single row group of the output file ({BATCH_SIZE} by default)')
+    args = parser.parse_args()
+
+    if args.replay and not args.cache:
+        parser.error('--replay requires --cache')
+
+    cache = PageCache(args.cache, replay=args.replay) if args.cache else None
+
+    if not os.path.exists(args.folder):
+        os.makedirs(args.folder)
+
+    output_name = f"tg-posts-{args.channel}-{args.start}-{args.finish}{file_suffix(args.compression)}"
+    print(f"\n🧲 Scraping '{args.channel}' posts between {args.start} and {args.finish} in {args.shards} shards...\n")
+
+    writer_options = dict(compression=args.compression, compression_level=args.compression_level, batch_size=args.row_group_size)
+    rows = scrape_sharded(args.channel, args.start, args.finish, os.path.join(args.folder, output_name), args.shards, args.rate, not args.mask, cache, args.fast, writer_options)
+
+    print(f"✔️ Successfully scraped {rows} posts from '{args.channel}' Telegram channel.")
+    print(f"\n🔽 Dataset saved in '{args.folder}' folder as '{output_name}'")
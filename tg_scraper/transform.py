@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+import hashlib
+import importlib
+import zoneinfo
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# Links and hashtags counted by 'content_stats', in the RE2 syntax of pyarrow.compute
+LINK_PATTERN = r'https?://\S+'
+HASHTAG_PATTERN = r'#[\p{L}\p{N}_]+'
+
+# Digest size of 'hash_content' in bytes
+HASH_SIZE = 16
+
+
+def _set_column(batch, name, values, field=None):
+    # Replace a column, or append it if the batch does not have it yet
+    field = field or pa.field(name, values.type)
+    index = batch.schema.get_field_index(name)
+    columns = list(batch.columns)
+    fields = list(batch.schema)
+    if index < 0:
+        columns.append(values)
+        fields.append(field)
+    else:
+        columns[index] = values
+        fields[index] = field
+    return pa.RecordBatch.from_arrays(columns, schema=pa.schema(fields))
+
+
+def hash_content(key=b''):
+    """
+    This function returns a transform which substitutes post contents with their
+    keyed BLAKE2b hashes, so equal contents can still be matched without storing them.
+    pyarrow.compute has no cryptographic hash, so the hashes are computed with hashlib
+    for the whole column at once, outside of the scraping loop.
+
+    Parameters:
+    - key (bytes): The secret key of the hashes, without it short contents can be
+      guessed by hashing candidates. The default value is no key.
+
+    Returns:
+        callable: The transform.
+    """
+    def transform(batch):
+        hashes = [
+            None if content is None else hashlib.blake2b(content.encode('utf-8'), digest_size=HASH_SIZE, key=key).hexdigest()
+            for content in batch.column('content').to_pylist()
+            ]
+        return _set_column(batch, 'content', pa.array(hashes, pa.string()), batch.schema.field('content'))
+
+    return transform
+
+
+def date_window(start_date, finish_date, timezone='UTC'):
+    """
+    This function returns a transform which keeps only the posts published
+    between the beginning of 'start_date' and the end of 'finish_date' in a timezone.
+
+    Parameters:
+    - start_date (str): The first date, in the format 'YYYY-MM-DD'.
+
+    - finish_date (str): The last date (including it), in the format 'YYYY-MM-DD'.
+
+    - timezone (str): The IANA name of the timezone of the dates, e.g. 'Europe/Kyiv'.
+      The default value is 'UTC'.
+
+    Returns:
+        callable: The transform.
+    """
+    tz = zoneinfo.ZoneInfo(timezone)
+    lower = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=tz)
+    upper = datetime.strptime(finish_date, '%Y-%m-%d').replace(tzinfo=tz) + timedelta(days=1)
+
+    def transform(batch):
+        dates = batch.column('date')
+        bounds = pa.scalar(lower, dates.type), pa.scalar(upper, dates.type)
+        return batch.filter(pc.and_(pc.greater_equal(dates, bounds[0]), pc.less(dates, bounds[1])))
+
+    return transform
+
+
+def content_stats(batch):
+    """
+    This function adds the 'content_length' (in characters), 'link_count' and
+    'hashtag_count' columns computed from the post contents.
+
+    Returns:
+        pyarrow.RecordBatch
+    """
+    contents = batch.column('content')
+    batch = _set_column(batch, 'content_length', pc.utf8_length(contents).cast(pa.int32()))
+    batch = _set_column(batch, 'link_count', pc.count_substring_regex(contents, LINK_PATTERN).cast(pa.int32()))
+    return _set_column(batch, 'hashtag_count', pc.count_substring_regex(contents, HASHTAG_PATTERN).cast(pa.int32()))
+
+
+def load_transform(name):
+    """
+    This function imports a custom transform by its 'module:function' name, e.g.
+    'my_package.enrich:add_language'. A transform is a function which takes
+    a pyarrow.RecordBatch of posts and returns a new one.
+
+    Returns:
+        callable
+    """
+    module_name, _, function_name = name.partition(':')
+    if not function_name:
+        raise ValueError(f"Invalid transform '{name}', expected 'module:function'")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def apply_transforms(batch, transforms):
+    """
+    This function applies transforms to a record batch, in order.
+
+    Returns:
+        pyarrow.RecordBatch
+    """
+    for transform in transforms:
+        batch = transform(batch)
+    return batch
+
+
+def transform_schema(transforms, schema):
+    """
+    This function returns the schema of the batches produced by the transforms,
+    by applying them to an empty batch.
+
+    Returns:
+        pyarrow.Schema
+    """
+    return apply_transforms(pa.RecordBatch.from_pylist([], schema=schema), transforms).schema
@@ -0,0 +1,324 @@
+import glob
+import os
+import time
+
+import pyarrow as pa
+from pyarrow.parquet import ParquetFile, ParquetWriter
+
+from tg_scraper.transform import apply_transforms, transform_schema
+
+
+# Columns of the output file, fixed so files of different runs can be read as one dataset
+SCHEMA = pa.schema([
+    pa.field('post_id', pa.int64(), nullable=False),
+    pa.field('post_url', pa.string(), nullable=False),
+    pa.field('date', pa.timestamp('us', tz='UTC'), nullable=False),
+    pa.field('content', pa.string()),
+])
+
+# Number of posts kept in memory before they are flushed to the file as one row group
+BATCH_SIZE = 10_000
+
+# Default compression codec of the output files and the file name suffix of every codec
+COMPRESSION = 'gzip'
+SUFFIXES = {
+    'gzip': '.parquet.gzip',
+    'zstd': '.parquet.zstd',
+    'snappy': '.parquet.snappy',
+    'brotli': '.parquet.br',
+    'lz4': '.parquet.lz4',
+    'none': '.parquet',
+}
+
+# Ids and dates grow steadily and urls share the channel prefix, so they are delta encoded.
+# Contents are dictionary encoded, which pays off for masked and reposted contents and
+# falls back to plain encoding by itself once the dictionary of a row group gets too big.
+COLUMN_ENCODING = {
+    'post_id': 'DELTA_BINARY_PACKED',
+    'post_url': 'DELTA_BYTE_ARRAY',
+    'date': 'DELTA_BINARY_PACKED',
+}
+DICTIONARY_COLUMNS = ['content']
+
+
+def file_suffix(compression=COMPRESSION):
+    """
+    This function returns the output file name suffix of a compression codec,
+    e.g. '.parquet.zstd' for 'zstd'.
+
+    Returns:
+        str
+    """
+    if compression not in SUFFIXES:
+        raise ValueError(f"Unknown compression codec '{compression}', expected one of {', '.join(SUFFIXES)}")
+    return SUFFIXES[compression]
+
+
+def segment_paths(path):
+    """
+    This function lists the finalized part files of an output file that is being written,
+    or was being written by a run that was killed, e.g. 'tg-posts-x-y.part-00001.parquet.gzip'
+    for 'tg-posts-x-y.parquet.gzip'. Every part is a valid parquet file of one row group.
+
+    Returns:
+        list of str, in the order they were written.
+    """
+    stem, suffix = _split_suffix(path)
+    return sorted(glob.glob(f"{glob.escape(stem)}.part-[0-9][0-9][0-9][0-9][0-9]{suffix}"))
+
+
+def _split_suffix(path):
+    # The output file name without and with the suffix of its codec, which part files keep
+    for suffix in sorted(SUFFIXES.values(), key=len, reverse=True):
+        if path.endswith(suffix):
+            return path[:-len(suffix)], suffix
+    return path, ''
+
+
+def _fsync(path):
+    # Make a written file survive a power loss before it is renamed into place
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def write_options(schema=SCHEMA, compression=COMPRESSION, compression_level=None):
+    """
+    This function returns the parquet writer options of the output files:
+    the compression codec and level and the encodings of the schema columns.
+
+    Returns:
+        dict of ParquetWriter keyword arguments.
+    """
+    file_suffix(compression)
+    return {
+        'compression': compression,
+        'compression_level': compression_level,
+        'use_dictionary': [name for name in DICTIONARY_COLUMNS if name in schema.names],
+        'column_encoding': {name: encoding for name, encoding in COLUMN_ENCODING.items() if name in schema.names},
+        }
+
+
+class ParquetBatchWriter:
+    """
+    This class streams scraped posts into a parquet file in fixed-size row groups.
+
+    Posts are collected column by column and every 'batch_size' posts are written
+    as a separate row group, so memory use depends on the batch size and not on
+    the number of scraped posts.
+
+    A parquet file is only readable once its footer is written, so every flushed
+    row group is written as a finalized part file next to the output file first,
+    see 'segment_paths', and 'on_flush' is called once it is stored. 'close()' merges
+    the parts into the output file. A process killed in the middle of a run, even
+    without a chance to close the writer, leaves the parts of every flushed row group
+    behind as valid files of the channel. A writer of the same path removes the
+    parts and the file of an earlier run, as it replaces them.
+
+    Parameters:
+    - path (str): The output file path.
+
+    - batch_size (int): The number of posts in a single row group.
+      The default value is 10000.
+
+    - schema (pyarrow.Schema): The schema of the written posts, which is also
+      the output file schema without transforms. The default value is SCHEMA.
+
+    - on_flush (callable): If provided, it is called with every record batch
+      right after it was stored in a part file. The default value is None.
+
+    - on_timing (callable): If provided, it is called with 'write', the duration
+      in seconds and the number of rows of every write, see Metrics.observe.
+      The default value is None.
+
+    - compression (str): The compression codec, one of SUFFIXES.
+      The default value is 'gzip'.
+
+    - compression_level (int): The codec compression level, higher levels give
+      smaller files but slower writes. The default value is the codec default.
+
+    - transforms (list): Functions applied to every row group before it is written,
+      each takes a pyarrow.RecordBatch and returns a new one, see tg_scraper.transform.
+      They run on whole row groups, apart from the scraping loop, and their
+      duration is reported to 'on_timing' as 'transform'. The output file schema,
+      'file_schema', is the schema they produce. The default value is None.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, schema=SCHEMA, on_flush=None, on_timing=None, compression=COMPRESSION, compression_level=None, transforms=None):
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive number')
+
+        self.path = path
+        self.batch_size = batch_size
+        self.schema = schema
+        self.on_flush = on_flush
+        self.on_timing = on_timing
+        self.compression = compression
+        self.compression_level = compression_level
+        self.transforms = list(transforms or [])
+        self.file_schema = transform_schema(self.transforms, schema)
+        self.rows_written = 0
+        self._columns = {name: [] for name in schema.names}
+        self._batches = []
+        self._pending = 0
+        self._closed = False
+        self._writer = self._open()
+
+
+    def write(self, post):
+        """
+        This function adds a single post (a dictionary keyed by column names) to the current batch.
+        The batch is flushed once it reaches 'batch_size' posts.
+
+        Returns:
+            None
+        """
+        for name, values in self._columns.items():
+            values.append(post.get(name))
+        self._pending += 1
+
+        if self._pending >= self.batch_size:
+            self._write_row_groups(whole_only=True)
+
+
+    def write_batch(self, batch):
+        """
+        This function adds a whole record batch (or table) with the file schema
+        to the current batch, after the posts collected so far.
+        Full row groups of 'batch_size' posts are flushed right away.
+
+        Returns:
+            None
+        """
+        if batch.num_rows == 0:
+            return
+
+        self._collect_columns()
+        self._batches.extend(batch.to_batches() if isinstance(batch, pa.Table) else [batch])
+        self._pending += batch.num_rows
+
+        if self._pending >= self.batch_size:
+            self._write_row_groups(whole_only=True)
+
+
+    def flush(self):
+        """
+        This function writes all collected posts to the file and empties the current batch.
+
+        Returns:
+            None
+        """
+        self._write_row_groups(whole_only=False)
+
+
+    def _collect_columns(self):
+        # Turn the posts collected column by column into a record batch, keeping their order
+        if self._columns[self.schema.names[0]]:
+            self._batches.append(pa.RecordBatch.from_pydict(self._columns, schema=self.schema))
+            self._columns = {name: [] for name in self.schema.names}
+
+
+    def _write_row_groups(self, whole_only):
+        if self._pending == 0:
+            return
+
+        self._collect_columns()
+        table = pa.Table.from_batches(self._batches, schema=self.schema)
+
+        # Keep the remainder for the next row group, unless everything has to be written
+        size = table.num_rows - table.num_rows % self.batch_size if whole_only else table.num_rows
+        if size == 0:
+            return
+
+        written, rest = table.slice(0, size), table.slice(size)
+        self._batches = rest.to_batches()
+        self._pending = rest.num_rows
+
+        if self.transforms:
+            start = time.perf_counter()
+            # Transforms run once per row group, not once per scraped page
+            written = pa.Table.from_batches([apply_transforms(batch, self.transforms) for batch in written.combine_chunks().to_batches()], schema=self.file_schema)
+            if self.on_timing is not None:
+                self.on_timing('transform', time.perf_counter() - start, size)
+
+        # Transforms may filter out every post of a row group
+        if written.num_rows == 0:
+            return
+
+        start = time.perf_counter()
+        self.rows_written += self._write_table(written)
+        if self.on_timing is not None:
+            self.on_timing('write', time.perf_counter() - start, written.num_rows)
+
+        if self.on_flush is not None:
+            self.on_flush(written.combine_chunks().to_batches()[0])
+
+
+    def _open(self):
+        # The output file and the parts left by an earlier run of the same file are replaced
+        for path in [self.path] + segment_paths(self.path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._parts = []
+        return write_options(self.file_schema, self.compression, self.compression_level)
+
+
+    def _write_file(self, path, tables):
+        # Write a finalized file under a temporary name and move it into place in one step
+        tmp_path = path + '.tmp'
+        with ParquetWriter(tmp_path, self.file_schema, **self._writer) as writer:
+            for table in tables:
+                writer.write_table(table, row_group_size=self.batch_size)
+        _fsync(tmp_path)
+        os.replace(tmp_path, path)
+
+
+    def _write_table(self, table):
+        # Returns the number of rows stored, subclasses may skip some of them
+        stem, suffix = _split_suffix(self.path)
+        part = f"{stem}.part-{len(self._parts) + 1:05d}{suffix}"
+        self._write_file(part, [table])
+        self._parts.append(part)
+        return table.num_rows
+
+
+    def _read_parts(self):
+        for part in self._parts:
+            parquet_file = ParquetFile(part)
+            for i in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(i)
+
+
+    def _close(self):
+        # A single part already is the output file, more are merged one row group at a time
+        if len(self._parts) == 1:
+            os.replace(self._parts[0], self.path)
+        else:
+            self._write_file(self.path, self._read_parts())
+            for part in self._parts:
+                os.remove(part)
+        self._parts = []
+
+
+    def close(self):
+        """
+        This function flushes the remaining posts and finalizes the file.
+
+        Returns:
+            None
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        try:
+            self.flush()
+        finally:
+            self._close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()